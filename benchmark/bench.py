@@ -0,0 +1,380 @@
+"""
+Offline benchmark of TvpPlugin entry points.
+
+Every route is run headlessly (like Kodi does: `sys.argv` and `main.py`) against a local
+HTTP stand-in which serves recorded TVP API responses (cassettes) with configurable latency
+and jitter. Wall time, request count, transferred bytes and peak memory are reported per route
+and compared with a stored baseline.
+
+Cassette is a JSON-lines file of the add-on HTTP cassette (`HttpCassette` in main.py, reused here),
+every line is a single recorded request:
+
+    {"method": "GET", "url": "https://...?a=1", "params": {...}, "status": 200, "headers": {...}, "body": "..."}
+
+Binary bodies are stored with `"encoding": "base64"`. A request which is not recorded is served by
+a record with the same method, host, path and query names (e.g. EPG of another date) and counted
+as approximate.
+
+Default cassettes (benchmark/cassettes) are a small fixture set for the default routes. Record real
+responses with `--record` (network access needed). A route regresses if it is slower than the baseline
+(over `--tolerance`) or sends more requests. The baseline (benchmark/baseline.json) is written by
+`--save-baseline` only (all routes have to pass with every request found in the cassettes), never by hand.
+
+Kodi modules (xbmc, xbmcgui, xbmcplugin, xbmcvfs, xbmcaddon) are provided by the headless stub
+(benchmark/stub, see benchmark/run.py), libka has to be importable.
+
+Cold start of folder routes (`COLD_ROUTES`) is measured in a fresh interpreter, it must not
+import playback, subtitle or M3U only modules (`LAZY_MODULES`) and must fit in `--cold-budget`.
+The main.py module import alone is checked against a committed budget by benchmark/imports.py.
+
+Usage:
+
+    python benchmark/bench.py [CASSETTE...] [--latency MS] [--jitter MS] [--repeat N]
+                              [--route NAME=URL] [--baseline FILE] [--save-baseline] [--cold-budget MS]
+    python benchmark/bench.py --record DIR [--route NAME=URL]
+"""
+
+import sys
+import os
+import glob
+import json
+import time
+import random
+import base64
+import argparse
+import subprocess
+import threading
+import tracemalloc
+from statistics import median
+from types import SimpleNamespace
+from urllib.parse import urlsplit, parse_qsl
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests
+
+import run as runner
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN = 'plugin://plugin.video.kpl.tvp'
+
+CASSETTES = os.path.join(ROOT, 'benchmark', 'cassettes')
+
+#: Default routes (name → plugin URL): VoD root, live TV, TVP1 catch-up and live, TVP Sport channel.
+ROUTES = {
+    'listing': f'{PLUGIN}/listing/1785454',
+    'tv': f'{PLUGIN}/tv',
+    'replay_date': f'{PLUGIN}/replay/TVP1/{time.strftime("%Y%m%d")}',
+    'video': f'{PLUGIN}/video/51696827',
+    'station': f'{PLUGIN}/station/TVP1',
+    'build_m3u': f'{PLUGIN}/build_m3u?force=1&quiet=1',
+}
+
+#: Folder routes run in a fresh interpreter (cold start).
+COLD_ROUTES = ('listing', 'tv')
+#: Modules which are loaded on the first use only (playback, subtitles, M3U).
+LAZY_MODULES = ('pytz', 'ttml2ssa', 'inputstreamhelper')
+#: Metrics stored in the baseline.
+METRICS = ('wall', 'requests', 'bytes', 'peak')
+
+
+def load_cassette(paths):
+    """Returns HttpCassette (replay mode) with records of all `paths`."""
+    main = runner.module()
+    cassette = main['HttpCassette'](paths[0], mode=main['CassetteMode'].Replay)
+    for path in paths[1:]:
+        other = main['HttpCassette'](path, mode=main['CassetteMode'].Replay)
+        for key, recs in other.records.items():
+            cassette.records.setdefault(key, []).extend(recs)
+    return cassette
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Local HTTP stand-in. Request path is `/<scheme>/<host>/<path>?<query>`."""
+
+    daemon_threads = True
+
+    def __init__(self, cassette, *, latency=0, jitter=0):
+        super().__init__(('127.0.0.1', 0), ReplayHandler)
+        self.cassette = cassette
+        self.shapes = {}  # (method, host, path, query names) → request key, see `find()`
+        for key in cassette.records:
+            self.shapes.setdefault(self.shape(key), key)
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self._lock = threading.Lock()
+        self.reset()
+
+    @property
+    def base(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes = 0
+            self.misses = []
+            self.approximate = 0
+
+    @staticmethod
+    def shape(key):
+        method, host, path, query = key
+        return method, host, path, tuple(sorted({name for name, _ in parse_qsl(query, keep_blank_values=True)}))
+
+    def find(self, method, url):
+        """Returns recorded response and True if it's exact one (or None if nothing similar is recorded)."""
+        rec = self.cassette.find(method, url)
+        if rec is not None:
+            return rec, True
+        key = self.shapes.get(self.shape(self.cassette.key(method, url)))
+        if key is None:
+            return None, False
+        return self.cassette.find(key[0], rec_url(key)), False
+
+    def count(self, url, size, found, exact):
+        with self._lock:
+            self.requests += 1
+            self.bytes += size
+            if not found:
+                self.misses.append(url)
+            elif not exact:
+                self.approximate += 1
+
+
+def rec_url(key):
+    """Returns URL of request `key` (see `HttpCassette.key()`)."""
+    _, host, path, query = key
+    return f'https://{host}{path}' + (f'?{query}' if query else '')
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _replay(self):
+        server = self.server
+        scheme, _, rest = self.path.lstrip('/').partition('/')
+        url = f'{scheme}://{rest}'
+        delay = server.latency + random.uniform(-server.jitter, server.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        rec, exact = server.find(self.command, url)
+        if rec is None:
+            status, headers, body = 404, {'Content-Type': 'application/json'}, b'{}'
+        else:
+            status = rec.get('status', 200)
+            headers = {k: v for k, v in (rec.get('headers') or {}).items()
+                       if k.lower() not in ('content-length', 'content-encoding', 'transfer-encoding', 'connection')}
+            body = rec.get('body') or ''
+            body = base64.b64decode(body) if rec.get('encoding') == 'base64' else body.encode('utf-8')
+        self.send_response(status)
+        for key, val in headers.items():
+            self.send_header(key, val)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        server.count(url, len(body), rec is not None, exact)
+
+    do_GET = do_POST = do_HEAD = _replay
+
+
+def redirect_requests(server):
+    """Redirect all `requests` traffic to the replay server."""
+    original = requests.Session.request
+
+    def request(session, method, url, *args, **kwargs):
+        url = urlsplit(str(url))
+        url = f'{server.base}/{url.scheme}/{url.netloc}{url.path}' + (f'?{url.query}' if url.query else '')
+        kwargs.pop('verify', None)
+        return original(session, method, url, *args, **kwargs)
+
+    requests.Session.request = request
+    return original
+
+
+def run_route(url):
+    """Run plugin `url` like Kodi does (against the Kodi stub). Returns error or None."""
+    return runner.run(url)['error']
+
+
+def measure(server, url, *, repeat=1):
+    """Measure single route, returns median of `repeat` runs."""
+    runs = []
+    for _ in range(repeat):
+        server.reset()
+        tracemalloc.start()
+        start = time.perf_counter()
+        error = run_route(url)
+        wall = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        runs.append({'wall': wall, 'requests': server.requests, 'bytes': server.bytes, 'peak': peak,
+                     'misses': len(server.misses), 'approximate': server.approximate, 'error': error})
+    result = {key: median(run[key] for run in runs)
+              for key in ('wall', 'requests', 'bytes', 'peak', 'misses', 'approximate')}
+    result['error'] = next((run['error'] for run in runs if run['error']), None)
+    return result
+
+
+def cold_start(server, url):
+    """Run route in a fresh interpreter (see `cold_child()`), returns its result."""
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--cold-child', server.base, url],
+                          capture_output=True, text=True, check=False)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        return {'wall': 0, 'lazy': [], 'error': (proc.stderr.strip().splitlines() or ['no result'])[-1]}
+
+
+def cold_child(base, url):
+    """Cold start child: run single route and print wall time and loaded lazy modules (JSON)."""
+    runner.install()
+    redirect_requests(SimpleNamespace(base=base))
+    start = time.perf_counter()
+    error = run_route(url)
+    wall = time.perf_counter() - start
+    print(json.dumps({'wall': wall, 'lazy': [mod for mod in LAZY_MODULES if mod in sys.modules], 'error': error}))
+
+
+def report_cold(results, *, budget):
+    """Print cold start results. Returns True if any route is over budget or imports lazy modules."""
+    failed = False
+    print(f'{"cold start":<14} {"wall [s]":>18}')
+    for name, res in results.items():
+        print(f'{name:<14} {res["wall"]:>10.3f}')
+        if res['lazy']:
+            print(f'  imports lazy module(s): {", ".join(res["lazy"])}')
+            failed = True
+        if res['error']:
+            print(f'  ERROR {res["error"]}')
+        if budget and res['wall'] * 1000 > budget:
+            print(f'  over budget ({budget:.0f} ms)')
+            failed = True
+    return failed
+
+
+def report(results, baseline, *, tolerance):
+    """Print results (with baseline difference). Returns True if any route regressed."""
+    def delta(name, key):
+        base = baseline.get(name, {}).get(key)
+        if not base:
+            return ''
+        return f' ({(results[name][key] - base) / base:+.0%})'
+
+    regressed = False
+    print(f'{"route":<14} {"wall [s]":>18} {"requests":>14} {"bytes":>20} {"peak [KiB]":>20}')
+    for name, res in results.items():
+        print(f'{name:<14} {res["wall"]:>10.3f}{delta(name, "wall"):>8}'
+              f' {res["requests"]:>7.0f}{delta(name, "requests"):>7}'
+              f' {res["bytes"]:>12.0f}{delta(name, "bytes"):>8}'
+              f' {res["peak"] / 1024:>12.0f}{delta(name, "peak"):>8}')
+        if res['misses']:
+            print(f'  {res["misses"]:.0f} request(s) not found in cassette')
+        if res.get('approximate'):
+            print(f'  {res["approximate"]:.0f} request(s) served by similar record')
+        if res['error']:
+            print(f'  ERROR {res["error"]}')
+        base = baseline.get(name, {})
+        if base.get('wall') and res['wall'] > base['wall'] * (1 + tolerance):
+            print(f'  slower than baseline {base["wall"]:.3f} s (tolerance {tolerance:.0%})')
+            regressed = True
+        if base.get('requests') is not None and res['requests'] > base['requests']:
+            print(f'  more requests than baseline {base["requests"]:.0f}')
+            regressed = True
+    if not baseline:
+        print('no baseline, store one with --save-baseline')
+    return regressed
+
+
+def save_baseline(path, results):
+    """Store `results` metrics as the baseline. Returns False (nothing is stored) if any route is not clean."""
+    dirty = [name for name, res in results.items() if res['error'] or res['misses']]
+    if dirty:
+        print(f'baseline not saved, route(s) failed or missed cassette records: {", ".join(dirty)}')
+        return False
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({name: {key: res[key] for key in METRICS} for name, res in results.items()}, f, indent=2)
+        f.write('\n')
+    print(f'baseline saved to {path}')
+    return True
+
+
+def record(routes, directory):
+    """Run routes against the real services, record every route to `directory`/NAME.jsonl."""
+    main = runner.module()
+    os.makedirs(directory, exist_ok=True)
+    failed = False
+    for name, url in routes.items():
+        path = os.path.join(directory, f'{name}.jsonl')
+        if os.path.exists(path):
+            os.remove(path)
+        cassette = main['HttpCassette'](path, mode=main['CassetteMode'].Record)
+        cassette.install()
+        try:
+            error = run_route(url)
+        finally:
+            cassette.uninstall()
+        print(f'{name:<14} {path}' + (f'  ERROR {error}' if error else ''))
+        failed = failed or bool(error)
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['--cold-child']:
+        return cold_child(*argv[1:3])
+    p = argparse.ArgumentParser(description='Offline benchmark of TvpPlugin entry points.')
+    p.add_argument('cassettes', nargs='*', metavar='CASSETTE',
+                   help='recorded responses (JSON lines), default: benchmark/cassettes/*.jsonl')
+    p.add_argument('--record', metavar='DIR', help='record routes (real network) to DIR instead of benchmark')
+    p.add_argument('--latency', type=float, default=0, help='response latency [ms]')
+    p.add_argument('--jitter', type=float, default=0, help='response latency jitter [ms]')
+    p.add_argument('--repeat', type=int, default=3, help='runs per route (median is reported)')
+    p.add_argument('--route', action='append', default=[], metavar='NAME[=URL]',
+                   help='route to run (default: all), URL overrides the default one')
+    p.add_argument('--baseline', default=os.path.join(ROOT, 'benchmark', 'baseline.json'), help='baseline file')
+    p.add_argument('--save-baseline', action='store_true', help='store results as the new baseline')
+    p.add_argument('--tolerance', type=float, default=0.2, help='allowed wall time regression (0.2 = 20%%)')
+    p.add_argument('--cold-budget', type=float, default=None, metavar='MS', help='cold start budget [ms]')
+    args = p.parse_args(argv)
+
+    routes = dict(ROUTES)
+    if args.route:
+        routes = {}
+        for route in args.route:
+            name, _, url = route.partition('=')
+            routes[name] = url or ROUTES[name]
+
+    runner.install()
+    if args.record:
+        return record(routes, args.record)
+    cassettes = args.cassettes or sorted(glob.glob(os.path.join(CASSETTES, '*.jsonl')))
+    server = ReplayServer(load_cassette(cassettes), latency=args.latency, jitter=args.jitter)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    original = redirect_requests(server)
+    try:
+        results = {name: measure(server, url, repeat=args.repeat) for name, url in routes.items()}
+        cold = {name: cold_start(server, url) for name, url in routes.items() if name in COLD_ROUTES}
+    finally:
+        requests.Session.request = original
+        server.shutdown()
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except OSError:
+        baseline = {}
+    regressed = report(results, baseline, tolerance=args.tolerance)
+    regressed = report_cold(cold, budget=args.cold_budget) or regressed
+    if args.save_baseline and not save_baseline(args.baseline, results):
+        return 1
+    return 1 if regressed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Import-time check of main.py (module level code only, the plugin is not run).
+
+The main.py module body is executed in a fresh interpreter against the Kodi stub (benchmark/stub),
+with its dependencies (libka, Kodi modules) imported in advance, so only the add-on's own import
+cost is measured. The check fails if it takes longer than the budget (`BUDGET`, median of `--repeat`
+runs) or if it loads a module which has to be imported on the first use only (`LAZY_MODULES`).
+
+libka has to be importable.
+
+Usage:
+
+    python benchmark/imports.py [--budget MS] [--repeat N] [--json]
+"""
+
+import sys
+import os
+import ast
+import json
+import time
+import argparse
+import importlib
+import subprocess
+from statistics import median
+
+import run as runner
+
+
+#: Import budget of main.py module body [ms] (without libka and Kodi modules).
+BUDGET = 60
+#: Modules which are loaded on the first use only (playback, subtitles, M3U/XMLTV, searches, VoD catalog).
+LAZY_MODULES = ('pytz', 'ttml2ssa', 'inputstreamhelper', 'requests', 'sqlite3', 'hashlib', 'unicodedata',
+                'base64', 'concurrent.futures', 'xml.sax')
+#: Dependencies imported before main.py (their import time is not counted).
+DEPENDENCIES = ('libka', 'xbmc', 'xbmcaddon', 'xbmcgui', 'xbmcplugin', 'xbmcvfs')
+
+
+def dependencies(tree):
+    """Returns top-level imported modules of `tree` which are `DEPENDENCIES`."""
+    names = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.append(node.module)
+    return [name for name in names if name.partition('.')[0] in DEPENDENCIES]
+
+
+def is_lazy(name):
+    return any(name == mod or name.startswith(f'{mod}.') for mod in LAZY_MODULES)
+
+
+def child():
+    """Import-time child: exec main.py module body, print import and compile time and loaded modules (JSON)."""
+    runner.install()
+    tree = runner.module_code()
+    for name in dependencies(tree):
+        importlib.import_module(name)
+    start = time.perf_counter()
+    code = compile(tree, runner.MAIN, 'exec')
+    compiled = time.perf_counter() - start
+    before = set(sys.modules)
+    start = time.perf_counter()
+    exec(code, {'__name__': 'main', '__file__': runner.MAIN})
+    wall = time.perf_counter() - start
+    modules = sorted(set(sys.modules) - before)
+    print(json.dumps({'wall': wall, 'compile': compiled, 'modules': modules,
+                      'lazy': [name for name in modules if is_lazy(name)]}))
+
+
+def measure():
+    """Run `child()` in a fresh interpreter, returns its result."""
+    proc = subprocess.run([sys.executable, os.path.abspath(__file__), '--child'],
+                          capture_output=True, text=True, check=False)
+    try:
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise SystemExit((proc.stderr.strip().splitlines() or ['no result'])[-1])
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ['--child']:
+        return child()
+    p = argparse.ArgumentParser(description='Import-time check of main.py.')
+    p.add_argument('--budget', type=float, default=BUDGET, metavar='MS', help=f'import budget [ms], default {BUDGET}')
+    p.add_argument('--repeat', type=int, default=5, help='fresh interpreter runs (median is checked)')
+    p.add_argument('--json', action='store_true', help='print results as JSON')
+    args = p.parse_args(argv)
+
+    runs = [measure() for _ in range(args.repeat)]
+    wall = median(run['wall'] for run in runs)
+    lazy = sorted({name for run in runs for name in run['lazy']})
+    if args.json:
+        print(json.dumps({'wall': wall, 'compile': median(run['compile'] for run in runs), 'lazy': lazy,
+                          'modules': runs[-1]['modules']}))
+    else:
+        print(f'main.py import {wall * 1000:.1f} ms (budget {args.budget:.0f} ms),'
+              f' compile {median(run["compile"] for run in runs) * 1000:.1f} ms,'
+              f' {len(runs[-1]["modules"])} module(s) loaded')
+    failed = False
+    if wall * 1000 > args.budget:
+        print(f'  over budget ({args.budget:.0f} ms)')
+        failed = True
+    if lazy:
+        print(f'  imports lazy module(s): {", ".join(lazy)}')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
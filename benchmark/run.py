@@ -0,0 +1,160 @@
+"""
+Run TvpPlugin headlessly against the Kodi stub (benchmark/stub).
+
+Every plugin URL is run like Kodi does (`sys.argv` and `main.py`), everything sent to Kodi
+(directory items, resolved URL, dialogs, controls) is recorded and printed. `main.py` is compiled
+once, so thousands of simulated navigations (`--crawl N`, random walk over folders) are cheap.
+
+libka has to be importable, network requests go to the real services (use the add-on
+HTTP cassette setting in replay mode or benchmark/bench.py for offline runs).
+
+Usage:
+
+    python benchmark/run.py URL [URL...] [--setting ID=VALUE] [--answer DIALOG=VALUE] [--json]
+    python benchmark/run.py URL --crawl N [--seed SEED]
+"""
+
+import sys
+import os
+import ast
+import json
+import time
+import random
+import argparse
+from urllib.parse import urlsplit
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB = os.path.join(ROOT, 'benchmark', 'stub')
+MAIN = os.path.join(ROOT, 'main.py')
+
+
+def install():
+    """Make the Kodi stub importable (real Kodi modules, if any, take precedence)."""
+    if STUB not in sys.path:
+        sys.path.append(STUB)
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    import kodistub
+    return kodistub
+
+
+_code = None
+_module = None
+
+
+def module_code():
+    """Returns main.py module AST without the final plugin run (`TvpPlugin().run()`)."""
+    with open(MAIN, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), MAIN)
+    last = tree.body[-1] if tree.body else None
+    if (isinstance(last, ast.Expr) and isinstance(last.value, ast.Call)
+            and isinstance(last.value.func, ast.Attribute) and last.value.func.attr == 'run'):
+        tree.body.pop()
+    return tree
+
+
+def module():
+    """Returns main.py module namespace (module level code only, the plugin is not run), e.g. HttpCassette."""
+    global _module
+    if _module is None:
+        install()
+        namespace = {'__name__': 'main', '__file__': MAIN}
+        exec(compile(module_code(), MAIN, 'exec'), namespace)
+        _module = namespace
+    return _module
+
+
+def run(url, *, handle=1):
+    """Run plugin `url` like Kodi does. Returns recorded invocation (dict) with `error` and `wall` time."""
+    global _code
+    kodistub = install()
+    if _code is None:
+        with open(MAIN, encoding='utf-8') as f:
+            _code = compile(f.read(), MAIN, 'exec')
+    kodistub.recorder.reset()
+    path, _, query = url.partition('?')
+    sys.argv = [path, str(handle), f'?{query}', 'resume:false']
+    error = None
+    start = time.perf_counter()
+    try:
+        exec(_code, {'__name__': '__main__', '__file__': MAIN})
+    except SystemExit:
+        pass
+    except Exception as exc:
+        error = f'{type(exc).__name__}: {exc}'
+    result = kodistub.recorder.as_dict()
+    result.update(url=url, error=error, wall=time.perf_counter() - start)
+    return result
+
+
+def crawl(start, count, *, seed=None):
+    """Random walk over folders, `count` navigations from `start`. Yields every result."""
+    rnd = random.Random(seed)
+    plugin = urlsplit(start).netloc
+    url = start
+    for _ in range(count):
+        result = run(url)
+        yield result
+        folders = [item['url'] for item in result['items']
+                   if item['folder'] and urlsplit(item['url']).netloc == plugin]
+        url = rnd.choice(folders) if folders else start
+
+
+def show(result):
+    """Print recorded invocation (human readable)."""
+    print(f'{result["url"]}  [{result["wall"] * 1000:.0f} ms]')
+    for item in result['items']:
+        print(f'  {"+" if item["folder"] else "-"} {item["label"]}  {item["url"]}')
+    if result['resolved']:
+        print(f'  resolved: {result["resolved"]["path"]} ({result["resolved"]["succeeded"]})')
+    for method, args in result['dialogs']:
+        print(f'  dialog {method}: {", ".join(args)}')
+    for builtin in result['builtins']:
+        print(f'  builtin: {builtin}')
+    for name, args in result['controls']:
+        print(f'  control {name}: {", ".join(args)}')
+    if result['error']:
+        print(f'  ERROR {result["error"]}')
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Run TvpPlugin headlessly against the Kodi stub.')
+    p.add_argument('urls', nargs='+', metavar='URL', help='plugin URL, e.g. plugin://plugin.video.kpl.tvp/tv')
+    p.add_argument('--setting', action='append', default=[], metavar='ID=VALUE', help='override add-on setting')
+    p.add_argument('--answer', action='append', default=[], metavar='DIALOG=VALUE',
+                   help='dialog answer (JSON value), e.g. yesno=true, input=\'"news"\'')
+    p.add_argument('--json', action='store_true', help='print results as JSON lines')
+    p.add_argument('--crawl', type=int, default=0, metavar='N', help='random walk N navigations from URL')
+    p.add_argument('--seed', type=int, default=None, help='random walk seed')
+    args = p.parse_args(argv)
+
+    kodistub = install()
+    for setting in args.setting:
+        sid, _, value = setting.partition('=')
+        kodistub.settings[sid] = value
+    for answer in args.answer:
+        method, _, value = answer.partition('=')
+        kodistub.dialog_answers[method] = json.loads(value)
+
+    if args.crawl:
+        results = crawl(args.urls[0], args.crawl, seed=args.seed)
+    else:
+        results = (run(url) for url in args.urls)
+    errors = walls = 0
+    for n, result in enumerate(results, 1):
+        errors += bool(result['error'])
+        walls += result['wall']
+        if args.json:
+            print(json.dumps(result, default=str))
+        elif not args.crawl:
+            show(result)
+        elif result['error']:
+            print(f'{result["url"]}  ERROR {result["error"]}')
+    if args.crawl and not args.json:
+        print(f'{n} navigations, {errors} error(s), {walls / n * 1000:.1f} ms average')
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
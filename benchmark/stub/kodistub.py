@@ -0,0 +1,134 @@
+"""
+Headless Kodi stub, state shared by the stub modules (xbmc, xbmcgui, xbmcplugin, xbmcvfs, xbmcaddon).
+
+`recorder` collects everything the add-on sends to Kodi: directory items, resolved URLs,
+dialogs, notifications, built-ins and window controls. Add-on settings come from
+`resources/settings.xml` defaults (`settings` overrides them), strings from en_gb `strings.po`.
+
+Environment:
+    KODI_STUB_PROFILE – add-on profile directory (default: <tmp>/kodistub/<addon-id>)
+    KODI_STUB_LOG     – minimal log level to print on stderr (0..4, default: no log)
+"""
+
+import os
+import re
+import sys
+import tempfile
+from xml.etree import ElementTree
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+ADDON = ElementTree.parse(os.path.join(ROOT, 'addon.xml')).getroot().attrib
+ADDON_ID = ADDON['id']
+PROFILE = os.environ.get('KODI_STUB_PROFILE') or os.path.join(tempfile.gettempdir(), 'kodistub', ADDON_ID)
+TEMP = os.path.join(tempfile.gettempdir(), 'kodistub', 'temp')
+LOG_LEVEL = int(os.environ.get('KODI_STUB_LOG', 99))
+
+#: Info labels (xbmc.getInfoLabel).
+info_labels = {
+    'System.BuildVersion': '20.0 (20.0.0) Git:stub',
+    'System.Language': 'English',
+}
+#: Answers for dialogs (xbmcgui.Dialog), key is a method name, e.g. {'yesno': True, 'input': 'news'}.
+dialog_answers = {
+    'ok': True,
+    'yesno': False,
+    'yesnocustom': -1,
+    'select': -1,
+    'multiselect': None,
+    'contextmenu': -1,
+    'input': '',
+    'numeric': '',
+    'browse': '',
+    'browseSingle': '',
+    'browseMultiple': [],
+}
+
+
+class Recorder:
+    """Records single plugin invocation."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.items = []         # directory items: dict(url, label, label2, folder, props, art, info)
+        self.resolved = None    # setResolvedUrl: dict(succeeded, path, props)
+        self.end = None         # endOfDirectory arguments
+        self.content = None     # setContent
+        self.category = None    # setPluginCategory
+        self.sort_methods = []  # addSortMethod
+        self.dialogs = []       # (method, args)
+        self.builtins = []      # executebuiltin
+        self.controls = []      # window controls: (class name, args)
+
+    def dialog(self, method, *args):
+        self.dialogs.append((method, args))
+        return dialog_answers.get(method)
+
+    def as_dict(self):
+        return {
+            'items': self.items,
+            'resolved': self.resolved,
+            'end': self.end,
+            'content': self.content,
+            'category': self.category,
+            'sort_methods': self.sort_methods,
+            'dialogs': [[method, [str(a) for a in args]] for method, args in self.dialogs],
+            'builtins': self.builtins,
+            'controls': [[name, [str(a) for a in args]] for name, args in self.controls],
+        }
+
+
+def _load_settings():
+    """Returns settings defaults {id: (type, str-value)} from resources/settings.xml."""
+    result = {}
+    for elem in ElementTree.parse(os.path.join(ROOT, 'resources', 'settings.xml')).iter('setting'):
+        sid = elem.get('id')
+        if sid:
+            default = elem.find('default')
+            result[sid] = (elem.get('type', 'string'), '' if default is None else (default.text or ''))
+    return result
+
+
+def _load_strings():
+    """Returns {id: text} from en_gb strings.po."""
+    path = os.path.join(ROOT, 'resources', 'language', 'resource.language.en_gb', 'strings.po')
+    result = {}
+    with open(path, encoding='utf-8') as f:
+        for num, text in re.findall(r'^msgctxt\s+"#(\d+)"\s*\nmsgid\s+"(.*)"', f.read(), re.MULTILINE):
+            result[int(num)] = text.replace('\\"', '"')
+    return result
+
+
+recorder = Recorder()
+settings = {sid: value for sid, (stype, value) in _load_settings().items()}
+strings = _load_strings()
+
+
+def log(msg, level=0):
+    if level >= LOG_LEVEL:
+        print(f'[kodi:{level}] {msg}', file=sys.stderr)
+
+
+class Generic:
+    """Any method is accepted and does nothing (returns None)."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+def module_getattr(module_name):
+    """Module `__getattr__`: unknown UPPER_CASE names are int constants, others are Generic classes."""
+    def getattr_(name):
+        if name.startswith('__'):
+            raise AttributeError(f'module {module_name!r} has no attribute {name!r}')
+        if name.isupper():
+            return 0
+        return type(name, (Generic,), {'__module__': module_name})
+    return getattr_
@@ -0,0 +1,106 @@
+"""Headless stub of Kodi `xbmc` module."""
+
+import os
+import time
+import json
+import kodistub
+
+
+LOGDEBUG, LOGINFO, LOGWARNING, LOGERROR, LOGFATAL, LOGNONE = 0, 1, 2, 3, 4, 5
+LOGNOTICE = LOGINFO
+PLAYLIST_MUSIC, PLAYLIST_VIDEO = 0, 1
+
+
+def log(msg, level=LOGDEBUG):
+    kodistub.log(msg, level)
+
+
+def getInfoLabel(label):
+    return kodistub.info_labels.get(label, '')
+
+
+def getCondVisibility(condition):
+    return False
+
+
+def executebuiltin(function, wait=False):
+    kodistub.recorder.builtins.append(function)
+
+
+def executeJSONRPC(request):
+    req = json.loads(request)
+    return json.dumps({'id': req.get('id'), 'jsonrpc': '2.0', 'result': {}})
+
+
+def getLanguage(format=None, region=False):
+    return 'English'
+
+
+def getRegion(id):
+    return {'datelong': '%A, %d %B %Y', 'dateshort': '%d.%m.%Y', 'time': '%H:%M:%S'}.get(id, '')
+
+
+def getSkinDir():
+    return 'skin.estuary'
+
+
+def sleep(time_ms):
+    time.sleep(time_ms / 1000)
+
+
+def translatePath(path):
+    import xbmcvfs
+    return xbmcvfs.translatePath(path)
+
+
+class Monitor:
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=-1):
+        return False
+
+
+class Player(kodistub.Generic):
+
+    def isPlaying(self):
+        return False
+
+
+class InfoTagVideo:
+    """Video info tag, all `setX(value)` calls are stored in `info`."""
+
+    def __init__(self, offscreen=False):
+        self.info = {}
+
+    def __getattr__(self, name):
+        if name.startswith('set'):
+            def setter(*args, **kwargs):
+                self.info[name[3:].lower()] = args[0] if len(args) == 1 else args
+            return setter
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class Keyboard(kodistub.Generic):
+
+    def __init__(self, line='', heading='', hidden=False):
+        self._text = line
+
+    def doModal(self, autoclose=0):
+        self._text = kodistub.recorder.dialog('input', 'Keyboard') or self._text
+
+    def isConfirmed(self):
+        return bool(self._text)
+
+    def getText(self):
+        return self._text
+
+
+def getUserAgent():
+    return f'Kodi/20.0 ({os.name}) stub'
+
+
+__getattr__ = kodistub.module_getattr(__name__)
@@ -0,0 +1,100 @@
+"""Headless stub of Kodi `xbmcaddon` module."""
+
+import os
+import kodistub
+
+
+class Settings:
+    """Kodi 20 settings API (`Addon.getSettings()`)."""
+
+    def getBool(self, id):
+        return kodistub.settings.get(id, '').lower() == 'true'
+
+    def getInt(self, id):
+        try:
+            return int(kodistub.settings.get(id) or 0)
+        except ValueError:
+            return 0
+
+    def getNumber(self, id):
+        try:
+            return float(kodistub.settings.get(id) or 0)
+        except ValueError:
+            return 0.0
+
+    def getString(self, id):
+        return kodistub.settings.get(id, '')
+
+    def setBool(self, id, value):
+        kodistub.settings[id] = 'true' if value else 'false'
+
+    def setInt(self, id, value):
+        kodistub.settings[id] = str(int(value))
+
+    def setNumber(self, id, value):
+        kodistub.settings[id] = str(value)
+
+    def setString(self, id, value):
+        kodistub.settings[id] = str(value)
+
+
+class Addon:
+
+    def __init__(self, id=None):
+        self.id = id or kodistub.ADDON_ID
+
+    def getAddonInfo(self, id):
+        return {
+            'id': self.id,
+            'name': kodistub.ADDON.get('name', self.id),
+            'version': kodistub.ADDON.get('version', ''),
+            'author': kodistub.ADDON.get('provider-name', ''),
+            'path': kodistub.ROOT,
+            'profile': kodistub.PROFILE,
+            'icon': os.path.join(kodistub.ROOT, 'resources', 'media', 'icon.png'),
+            'fanart': os.path.join(kodistub.ROOT, 'resources', 'media', 'fanart.png'),
+            'type': 'xbmc.python.pluginsource',
+        }.get(id, '')
+
+    def getLocalizedString(self, id):
+        return kodistub.strings.get(id, '')
+
+    def getSettings(self):
+        return Settings()
+
+    def getSetting(self, id):
+        return kodistub.settings.get(id, '')
+
+    def getSettingBool(self, id):
+        return Settings().getBool(id)
+
+    def getSettingInt(self, id):
+        return Settings().getInt(id)
+
+    def getSettingNumber(self, id):
+        return Settings().getNumber(id)
+
+    def getSettingString(self, id):
+        return Settings().getString(id)
+
+    def setSetting(self, id, value):
+        kodistub.settings[id] = str(value)
+
+    def setSettingBool(self, id, value):
+        Settings().setBool(id, value)
+        return True
+
+    def setSettingInt(self, id, value):
+        Settings().setInt(id, value)
+        return True
+
+    def setSettingNumber(self, id, value):
+        Settings().setNumber(id, value)
+        return True
+
+    def setSettingString(self, id, value):
+        Settings().setString(id, value)
+        return True
+
+    def openSettings(self):
+        kodistub.recorder.dialog('openSettings')
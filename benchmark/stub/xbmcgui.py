@@ -0,0 +1,232 @@
+"""Headless stub of Kodi `xbmcgui` module."""
+
+import kodistub
+
+
+NOTIFICATION_INFO, NOTIFICATION_WARNING, NOTIFICATION_ERROR = 'info', 'warning', 'error'
+INPUT_ALPHANUM, INPUT_NUMERIC, INPUT_DATE, INPUT_TIME, INPUT_IPADDRESS, INPUT_PASSWORD = range(6)
+ACTION_MOVE_LEFT, ACTION_MOVE_RIGHT, ACTION_MOVE_UP, ACTION_MOVE_DOWN = 1, 2, 3, 4
+ACTION_SELECT_ITEM, ACTION_PREVIOUS_MENU, ACTION_NAV_BACK, ACTION_BACKSPACE = 7, 10, 92, 110
+ACTION_CONTEXT_MENU, ACTION_MOUSE_LEFT_CLICK = 117, 100
+
+
+class ListItem:
+    """List item, keeps label, path, properties, art and info (set via setInfo or the video info tag)."""
+
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        self.label = label
+        self.label2 = label2
+        self.path = path
+        self.props = {}
+        self.art = {}
+        self.info = {}
+        self.subtitles = []
+        self.context_menu = []
+        self._tag = None
+
+    def getLabel(self):
+        return self.label
+
+    def setLabel(self, label):
+        self.label = label
+
+    def getLabel2(self):
+        return self.label2
+
+    def setLabel2(self, label):
+        self.label2 = label
+
+    def getPath(self):
+        return self.path
+
+    def setPath(self, path):
+        self.path = path
+
+    def getProperty(self, key):
+        return self.props.get(key.lower(), '')
+
+    def setProperty(self, key, value):
+        self.props[key.lower()] = value
+
+    def setProperties(self, values):
+        for key, value in values.items():
+            self.setProperty(key, value)
+
+    def getArt(self, key):
+        return self.art.get(key, '')
+
+    def setArt(self, values):
+        self.art.update(values)
+
+    def setInfo(self, type, infoLabels):
+        self.info.update(infoLabels)
+
+    def getVideoInfoTag(self):
+        if self._tag is None:
+            import xbmc
+            self._tag = xbmc.InfoTagVideo()
+            self._tag.info = self.info
+        return self._tag
+
+    def setSubtitles(self, subtitleFiles):
+        self.subtitles = list(subtitleFiles)
+
+    def addContextMenuItems(self, items, replaceItems=False):
+        self.context_menu.extend(items)
+
+    def setIsFolder(self, isFolder):
+        self.props['isfolder'] = isFolder
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class Dialog:
+    """All dialogs are recorded, answers are taken from `kodistub.dialog_answers`."""
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: kodistub.recorder.dialog(name, *args)
+
+
+class DialogProgress:
+
+    def create(self, heading, message=''):
+        kodistub.recorder.dialog('progress', heading, message)
+
+    def update(self, percent, message=''):
+        pass
+
+    def iscanceled(self):
+        return False
+
+    def close(self):
+        pass
+
+
+class DialogProgressBG(DialogProgress):
+
+    def isFinished(self):
+        return False
+
+
+class Window:
+    """Window, all controls are recorded."""
+
+    def __init__(self, existingWindowId=-1, *args, **kwargs):
+        self.props = {}
+        self.controls = []
+
+    def addControl(self, control):
+        self.controls.append(control)
+        kodistub.recorder.controls.append((type(control).__name__, control.args))
+
+    def addControls(self, controls):
+        for control in controls:
+            self.addControl(control)
+
+    def removeControl(self, control):
+        if control in self.controls:
+            self.controls.remove(control)
+
+    def removeControls(self, controls):
+        for control in controls:
+            self.removeControl(control)
+
+    def getProperty(self, key):
+        return self.props.get(key, '')
+
+    def setProperty(self, key, value):
+        self.props[key] = value
+
+    def clearProperty(self, key):
+        self.props.pop(key, None)
+
+    def getWidth(self):
+        return 1280
+
+    def getHeight(self):
+        return 720
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class WindowDialog(Window):
+    pass
+
+
+class WindowXML(Window):
+    pass
+
+
+class WindowXMLDialog(WindowXML):
+    pass
+
+
+class Control:
+    """Control, keeps constructor arguments."""
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return lambda *args, **kwargs: None
+
+
+class ControlLabel(Control):
+    pass
+
+
+class ControlFadeLabel(Control):
+    pass
+
+
+class ControlTextBox(Control):
+    pass
+
+
+class ControlImage(Control):
+    pass
+
+
+class ControlButton(Control):
+    pass
+
+
+class ControlGroup(Control):
+    pass
+
+
+class ControlList(Control):
+    pass
+
+
+class ControlProgress(Control):
+    pass
+
+
+def getCurrentWindowId():
+    return 10025
+
+
+def getCurrentWindowDialogId():
+    return 9999
+
+
+def getScreenHeight():
+    return 720
+
+
+def getScreenWidth():
+    return 1280
+
+
+__getattr__ = kodistub.module_getattr(__name__)
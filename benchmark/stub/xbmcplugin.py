@@ -0,0 +1,57 @@
+"""Headless stub of Kodi `xbmcplugin` module."""
+
+import kodistub
+
+
+def _item(url, listitem, folder):
+    return {
+        'url': url,
+        'label': listitem.getLabel(),
+        'label2': listitem.getLabel2(),
+        'folder': bool(folder),
+        'props': dict(listitem.props),
+        'art': dict(listitem.art),
+        'info': dict(listitem.info),
+    }
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    kodistub.recorder.items.append(_item(url, listitem, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    for url, listitem, folder in items:
+        addDirectoryItem(handle, url, listitem, folder)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    kodistub.recorder.end = {'succeeded': succeeded, 'update': updateListing, 'cache': cacheToDisc}
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    kodistub.recorder.resolved = {'succeeded': succeeded, 'path': listitem.getPath(), 'props': dict(listitem.props)}
+
+
+def setContent(handle, content):
+    kodistub.recorder.content = content
+
+
+def setPluginCategory(handle, category):
+    kodistub.recorder.category = category
+
+
+def addSortMethod(handle, sortMethod, labelMask='', label2Mask=''):
+    kodistub.recorder.sort_methods.append(sortMethod)
+
+
+def setProperty(handle, key, value):
+    pass
+
+
+def setPluginFanart(handle, image=None, color1=None, color2=None, color3=None):
+    pass
+
+
+__getattr__ = kodistub.module_getattr(__name__)
@@ -0,0 +1,136 @@
+"""Headless stub of Kodi `xbmcvfs` module (special:// paths are mapped to local directories)."""
+
+import os
+import shutil
+import kodistub
+
+
+SPECIAL = {
+    f'special://profile/addon_data/{kodistub.ADDON_ID}': kodistub.PROFILE,
+    f'special://userdata/addon_data/{kodistub.ADDON_ID}': kodistub.PROFILE,
+    f'special://home/addons/{kodistub.ADDON_ID}': kodistub.ROOT,
+    'special://temp': kodistub.TEMP,
+}
+
+
+def translatePath(path):
+    for prefix, local in SPECIAL.items():
+        if path.startswith(prefix):
+            return local + path[len(prefix):]
+    return path
+
+
+def exists(path):
+    return os.path.exists(translatePath(path))
+
+
+def mkdir(path):
+    try:
+        os.mkdir(translatePath(path))
+    except OSError:
+        return False
+    return True
+
+
+def mkdirs(path):
+    os.makedirs(translatePath(path), exist_ok=True)
+    return True
+
+
+def delete(path):
+    try:
+        os.remove(translatePath(path))
+    except OSError:
+        return False
+    return True
+
+
+def rmdir(path, force=False):
+    try:
+        if force:
+            shutil.rmtree(translatePath(path))
+        else:
+            os.rmdir(translatePath(path))
+    except OSError:
+        return False
+    return True
+
+
+def rename(path, new_path):
+    try:
+        os.replace(translatePath(path), translatePath(new_path))
+    except OSError:
+        return False
+    return True
+
+
+def copy(path, new_path):
+    try:
+        shutil.copyfile(translatePath(path), translatePath(new_path))
+    except OSError:
+        return False
+    return True
+
+
+def listdir(path):
+    path = translatePath(path)
+    names = os.listdir(path)
+    return ([n for n in names if os.path.isdir(os.path.join(path, n))],
+            [n for n in names if not os.path.isdir(os.path.join(path, n))])
+
+
+def makeLegalFilename(filename):
+    return filename
+
+
+def validatePath(path):
+    return path
+
+
+class File:
+
+    def __init__(self, path, mode='r'):
+        path = translatePath(path)
+        if 'w' in mode:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._file = open(path, 'wb' if 'w' in mode else 'rb')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, size=-1):
+        return self._file.read(size).decode('utf-8')
+
+    def readBytes(self, size=-1):
+        return bytearray(self._file.read(size))
+
+    def write(self, buffer):
+        self._file.write(buffer.encode('utf-8') if isinstance(buffer, str) else buffer)
+        return True
+
+    def size(self):
+        return os.fstat(self._file.fileno()).st_size
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def close(self):
+        self._file.close()
+
+
+class Stat:
+
+    def __init__(self, path):
+        self._stat = os.stat(translatePath(path))
+
+    def st_size(self):
+        return self._stat.st_size
+
+    def st_mtime(self):
+        return int(self._stat.st_mtime)
+
+
+__getattr__ = kodistub.module_getattr(__name__)
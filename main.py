@@ -10,27 +10,26 @@ from libka.calendar import str2date
 from libka.search import search, Search
 from libka.settings import Settings
 # from pdom import select as dom_select
-from urllib.parse import quote
+from urllib.parse import quote, urlsplit, urlencode, parse_qsl
 import json
+import os
+import time
+import threading
+import sys
 import xbmcaddon # for default add-on image TODO: fill get_default_art() function from libka
 from collections.abc import Mapping
 from collections import namedtuple, UserList, UserDict
 from html import unescape
+from contextlib import contextmanager
 from datetime import datetime, timedelta
-import pytz
 import re
 from enum import IntEnum
+from bisect import bisect_left, bisect_right
+from functools import partial, lru_cache
+from itertools import chain
 import xbmc  # for getCondVisibility and getInfoLabel
 import xbmcgui  # dialogs
 import xbmcplugin  # setResolvedUrl
-import xbmcvfs  # for file in m3u generator
-import requests
-from requests.models import PreparedRequest
-
-try:
-    from ttml2ssa import Ttml2SsaAddon
-except ModuleNotFoundError:
-    Ttml2SsaAddon = None  # DEBUG only
 
 # XXX
 # Na razie wszystko jest w jednym pliku, bo łatwiej odświeżać w kodi.
@@ -43,7 +42,6 @@ UNLIMITED = object()
 Future = object()
 CurrentAndFuture = object()
 
-KODI_VERSION = int(xbmc.getInfoLabel('System.BuildVersion')[:2])
 UA = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko)'
       ' Chrome/103.0.5060.134 Safari/537.36 Edg/103.0.1264.71')
 
@@ -59,6 +57,12 @@ class TvIconType(IntEnum):
     EpgIcon = 1
 
 
+class CassetteMode(IntEnum):
+    Off = 0
+    Record = 1
+    Replay = 2
+
+
 class TvEntryFormat(IntEnum):
     Custom = 0
     TIME_CHAN_TITLE = 1
@@ -101,7 +105,96 @@ remove_tags.replace = {
 }
 
 
+# Playback-only, subtitle-only and M3U-only dependencies are imported on the first use (faster cold start).
+@lru_cache(maxsize=None)
+def kodi_version():
+    """Returns Kodi major version."""
+    return int(xbmc.getInfoLabel('System.BuildVersion')[:2])
+
+
+@lru_cache(maxsize=None)
+def ttml2ssa():
+    """Returns Ttml2SsaAddon class or None if ttml2ssa is missing."""
+    try:
+        from ttml2ssa import Ttml2SsaAddon
+    except ModuleNotFoundError:
+        return None  # DEBUG only
+    return Ttml2SsaAddon
+
+
+@lru_cache(maxsize=None)
+def json_loads():
+    """Returns the fastest available JSON `loads()`: orjson if installed, json otherwise."""
+    try:
+        import orjson
+    except ModuleNotFoundError:
+        return json.loads
+    return orjson.loads
+
+
+#: JSON scanner token: string (group 1 is empty if not terminated yet) or bracket.
+_JSON_TOKEN = re.compile(r'"(?:[^"\\]|\\.)*("?)|[\[\]{}]', re.DOTALL)
+
+
+def iter_json_items(chunks, key='items', *, loads=None):
+    """
+    Yields elements (objects or arrays) of top-level `key` array from JSON text `chunks`.
+
+    Only the current element is kept in memory and decoded by `loads` (see `json_loads()`),
+    other top-level values are skipped. Returns (`StopIteration.value`) True if `key` array was found.
+    """
+    if loads is None:
+        loads = json_loads()
+    target = f'"{key}"'
+    chunks = iter(chunks)
+    buf, pos, depth = '', 0, 0
+    name = name_end = None  # the last top-level string (key candidate)
+    start = None  # current element start
+    inside = False  # in `key` array
+    while True:
+        match = _JSON_TOKEN.search(buf, pos)
+        if match is None or (match.group(0)[0] == '"' and not match.group(1)):
+            chunk = next(chunks, None)
+            if chunk is None:
+                return inside
+            cut = pos if start is None else start
+            buf, pos = buf[cut:] + chunk, pos - cut
+            if start is not None:
+                start = 0
+            if name_end is not None:
+                name_end -= cut
+            continue
+        token = match.group(0)
+        pos = match.end()
+        if token[0] == '"':
+            if depth == 1 and not inside:
+                name, name_end = token, pos
+        elif token in '[{':
+            depth += 1
+            if inside:
+                if depth == 3:
+                    start = match.start()
+            elif depth == 2 and token == '[' and name == target and buf[name_end:match.start()].strip() == ':':
+                inside = True
+        else:
+            depth -= 1
+            if inside:
+                if depth == 2 and start is not None:
+                    yield loads(buf[start:pos])
+                    start = None
+                elif depth == 1:
+                    return True
+
+
+def str2bool(value):
+    """Returns bool of URL argument: "1", "true", "yes" and "on" are True, "0", "false" etc. are False."""
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'on')
+    return bool(value)
+
+
 def timezone_offset(timezone):
+    import pytz
     naive = datetime.now()
     tz = pytz.timezone(timezone)
     aware = tz.localize(naive)
@@ -143,6 +236,25 @@ ChannelInfo = namedtuple('ChannelInfo', 'code name image id epg', defaults=(None
 ChannelInfo.__str__ = lambda self: self.name
 
 
+class VodProduct(namedtuple('VodProduct', 'id title lead paid trailer data')):
+
+    @classmethod
+    def parse(cls, data):
+        return VodProduct(data.get('id'), title=data.get('title', ''), lead=data.get('lead'),
+                          paid=bool(data.get('paymentSchedules')), trailer=bool(data.get('trailer')), data=data)
+
+
+class VodPlaylist(namedtuple('VodPlaylist', 'id video_type url paid data')):
+
+    @classmethod
+    def parse(cls, id, video_type, data):
+        try:
+            url = data['sources']['HLS'][0]['src']
+        except (KeyError, IndexError, TypeError):
+            url = None
+        return VodPlaylist(id, video_type=video_type, url=url, paid=(data.get('code') == 'ITEM_NOT_PAID'), data=data)
+
+
 class Info(namedtuple('Info', 'data type url title image descr series linkid')):
 
     @classmethod
@@ -223,6 +335,783 @@ class ChannelProgram(UserDict):
         return self.title
 
 
+def dump_json(path, data, **kwargs):
+    """Write JSON file atomically, via temporary file unique for the process (safe for concurrent writers)."""
+    import tempfile
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=str(path.parent), prefix=f'.{path.name}.',
+                                     suffix='.tmp', delete=False) as f:
+        json.dump(data, f, **kwargs)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.unlink(f.name)
+        raise
+
+
+class JsonCache:
+    """
+    Persistent JSON cache (key → value with timestamp) in a single file.
+
+    Cache could be shared by a few plugin processes, `save()` merges entries written by others (newer wins).
+    """
+
+    def __init__(self, path, *, ttl=None):
+        self.path = Path(path)
+        self.ttl = ttl
+        self._data = None
+        self._removed = {}  # key: removal time, since the last save
+        self._lock = threading.RLock()
+
+    @property
+    def data(self):
+        with self._lock:
+            if self._data is None:
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        self._data = json.load(f)
+                except (OSError, ValueError):
+                    self._data = {}
+            return self._data
+
+    def age(self, key):
+        """Returns age (in seconds) of `key` or None if missing."""
+        rec = self.data.get(str(key))
+        if rec is None:
+            return None
+        return time.time() - rec['t']
+
+    def expired(self, key, *, ttl=MISSING):
+        """Returns True if `key` is missing or older than `ttl`."""
+        if ttl is MISSING:
+            ttl = self.ttl
+        age = self.age(key)
+        return age is None or (ttl is not None and age > ttl)
+
+    def get(self, key, default=None, *, ttl=MISSING):
+        """Returns cached value or `default` if missing or expired."""
+        if self.expired(key, ttl=ttl):
+            return default
+        return self.data[str(key)]['v']
+
+    def set(self, key, value, *, save=True):
+        with self._lock:
+            self.data[str(key)] = {'t': time.time(), 'v': value}
+            if save:
+                self.save()
+        return value
+
+    def purge(self, *, ttl=MISSING, save=True):
+        """Remove all entries older than `ttl`."""
+        with self._lock:
+            for key in [key for key in self.data if self.expired(key, ttl=ttl)]:
+                del self.data[key]
+                self._removed[key] = time.time()
+            if save:
+                self.save()
+
+    def remove(self, key, *, save=True):
+        with self._lock:
+            if self.data.pop(str(key), MISSING) is not MISSING:
+                self._removed[str(key)] = time.time()
+                if save:
+                    self.save()
+
+    def save(self):
+        """Merge with entries saved by other processes meanwhile and write cache atomically."""
+        with self._lock:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    disk = json.load(f)
+            except (OSError, ValueError):
+                disk = {}
+            data = self.data
+            for key, rec in disk.items():
+                mine = data.get(key)
+                if mine is None:
+                    if self._removed.get(key, 0) < rec['t']:
+                        data[key] = rec
+                elif rec['t'] > mine['t']:
+                    data[key] = rec
+            self._removed.clear()
+            dump_json(self.path, data)
+
+
+class EpgIndex:
+    """Multi-channel interval index over EPG: `{code: ChannelEpg}`."""
+
+    def __init__(self, epgs):
+        self.progs = {code: sorted(epg, key=lambda prog: prog.start) for code, epg in epgs.items()}
+        self._starts = {code: [prog.start for prog in progs] for code, progs in self.progs.items()}
+
+    def at(self, when):
+        """Returns program on every channel at `when`: `{code: ChannelProgram|None}`."""
+        result = {}
+        for code, progs in self.progs.items():
+            i = bisect_right(self._starts[code], when) - 1
+            result[code] = progs[i] if i >= 0 and progs[i].end > when else None
+        return result
+
+    def window(self, start, end):
+        """Returns programs overlapping `start`..`end` on every channel: `{code: [ChannelProgram]}`."""
+        result = {}
+        for code, progs in self.progs.items():
+            i = max(bisect_right(self._starts[code], start) - 1, 0)
+            result[code] = []
+            for prog in progs[i:]:
+                if prog.start >= end:
+                    break
+                if prog.end > start:
+                    result[code].append(prog)
+        return result
+
+
+class CatchupIndex:
+    """Persistent (station_code, start time) → (record_id, end time) index for catch-up lookups."""
+
+    def __init__(self, path, *, keep=8 * 24 * 3600):
+        self.path = Path(path)
+        self.keep = keep  # how long (seconds) programs are kept in the index
+        self._stations = {}
+        self._lock = threading.RLock()
+
+    def _load(self, code):
+        """Returns {start_timestamp: [record_id, end_timestamp]} for station `code` from disk."""
+        try:
+            with open(self.path / f'{code}.json', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # old index has record_id only
+        return {int(start): prog if isinstance(prog, list) else [prog, None] for start, prog in data.items()}
+
+    def _station(self, code):
+        """Returns {start_timestamp: [record_id, end_timestamp]} for station `code`."""
+        try:
+            return self._stations[code]
+        except KeyError:
+            progs = self._stations[code] = self._load(code)
+            return progs
+
+    def update(self, code, items):
+        """Add EPG `items` (station_epg data) of station `code` to the index."""
+        new = {int(it['date_start'] // 1000): [it['record_id'], it['date_end'] // 1000 if it.get('date_end') else None]
+               for it in items or () if it.get('date_start') and it.get('record_id')}
+        if not code or not new:
+            return
+        with self._lock:
+            progs = self._station(code)
+            if all(progs.get(start) == prog for start, prog in new.items()):
+                return
+            # the index could be updated by another plugin process meanwhile
+            progs.update(self._load(code))
+            progs.update(new)
+            oldest = time.time() - self.keep
+            for start in [start for start in progs if start < oldest]:
+                del progs[start]
+            dump_json(self.path / f'{code}.json', progs)
+
+    def find(self, code, when, *, offset=timedelta(minutes=5), tolerance=timedelta(minutes=30)):
+        """
+        Returns record_id of program on `code` at `when` (PVR catch-up time) or None.
+
+        PVR time is `offset` before the real program start, the program which covers `when + offset`
+        is used. If not found (end time unknown) the first program started at or after `when`.
+        """
+        stamp, target = when.timestamp(), (when + offset).timestamp()
+        with self._lock:
+            progs = self._station(code)
+            starts = sorted(progs)
+        i = bisect_right(starts, target) - 1
+        if i >= 0:
+            rid, end = progs[starts[i]]
+            if end is not None and target < end:
+                return rid
+        i = bisect_left(starts, stamp)
+        if i < len(starts) and starts[i] - stamp <= tolerance.total_seconds():
+            return progs[starts[i]][0]
+        return None
+
+
+class EpgSearchIndex:
+    """Persistent full-text (inverted) index over EPG programs: title, cycle title and description."""
+
+    re_word = re.compile(r'\w{2,}')
+
+    def __init__(self, path, *, keep=8 * 24 * 3600):
+        self.path = Path(path)
+        self.keep = keep  # how long (seconds) finished programs are kept in the index
+        self._stations = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def words(cls, text):
+        """Returns normalized words (lower case, without diacritics) from `text`."""
+        import unicodedata
+        text = unicodedata.normalize('NFKD', (text or '').lower().replace('ł', 'l'))
+        return set(cls.re_word.findall(''.join(c for c in text if not unicodedata.combining(c))))
+
+    @staticmethod
+    def _record(code, item):
+        """Returns compact program record (enough for `ChannelProgram`)."""
+        def art(data):
+            return {k: v for k, v in (data or {}).items() if k == 'title' or k.startswith('image')}
+
+        prog = item.get('program') or {}
+        return {
+            'station_code': code,
+            **{k: item[k] for k in ('record_id', 'date_start', 'date_end', 'title', 'description') if k in item},
+            'program': {**art(prog), 'cycle': art(prog.get('cycle'))},
+        }
+
+    def _load(self, code):
+        try:
+            with open(self.path / f'{code}.json', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {'progs': {}, 'index': {}}
+        data['vocabulary'] = sorted(data['index'])
+        return data
+
+    def _station(self, code):
+        """Returns {'progs': {record_id: record}, 'index': {word: [record_id]}} for station `code`."""
+        try:
+            return self._stations[code]
+        except KeyError:
+            data = self._stations[code] = self._load(code)
+            return data
+
+    def update(self, code, items):
+        """Add EPG `items` (station_epg data) of station `code` to the index."""
+        new = {str(it['record_id']): self._record(code, it) for it in items or ()
+               if it.get('record_id') and it.get('date_start')}
+        if not code or not new:
+            return
+        with self._lock:
+            data = self._station(code)
+            progs = data['progs']
+            if all(progs.get(rid) == rec for rid, rec in new.items()):
+                return
+            # the index could be updated by another plugin process meanwhile
+            progs.update(self._load(code)['progs'])
+            progs.update(new)
+            oldest = (time.time() - self.keep) * 1000
+            for rid in [rid for rid, rec in progs.items() if rec['date_end'] < oldest]:
+                del progs[rid]
+            index = {}
+            for rid, rec in progs.items():
+                text = ' '.join((rec.get('title') or '', rec['program'].get('title') or '',
+                                 rec['program']['cycle'].get('title') or '', rec.get('description') or ''))
+                for word in self.words(text):
+                    index.setdefault(word, []).append(rid)
+            data['index'], data['vocabulary'] = index, sorted(index)
+            dump_json(self.path / f'{code}.json', {'progs': progs, 'index': index})
+
+    def codes(self):
+        """Returns all indexed station codes."""
+        try:
+            return [name[:-5] for name in os.listdir(self.path) if name.endswith('.json')]
+        except OSError:
+            return []
+
+    def search(self, query):
+        """Returns program records matching all words (prefixes) of `query`, sorted by start time."""
+        words = self.words(query)
+        if not words:
+            return []
+        found = []
+        with self._lock:
+            for code in self.codes():
+                data = self._station(code)
+                vocabulary, index = data['vocabulary'], data['index']
+                rids = None
+                for word in words:
+                    # prefix match: all vocabulary words started with `word`
+                    matched = set()
+                    for i in range(bisect_right(vocabulary, word) - 1, len(vocabulary)):
+                        if i < 0:
+                            continue
+                        voc = vocabulary[i]
+                        if voc.startswith(word):
+                            matched.update(index[voc])
+                        elif voc > word:
+                            break
+                    rids = matched if rids is None else rids & matched
+                    if not rids:
+                        break
+                found.extend(data['progs'][rid] for rid in rids or ())
+        return sorted(found, key=lambda rec: rec['date_start'])
+
+
+class VodCatalog:
+    """
+    Local SQLite mirror of VoD directory tree with full-text search (titles and leads).
+
+    The same asset could be listed under many parents, items are stored per (parent_id, asset_id).
+    """
+
+    #: Database schema version, older database is dropped (it's a mirror only).
+    SCHEMA = 2
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._fts = None
+
+    @contextmanager
+    def connect(self):
+        """Connection (per thread) to the catalog database, commit on exit."""
+        import sqlite3
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        db = sqlite3.connect(str(self.path), timeout=30)
+        try:
+            db.execute('PRAGMA journal_mode=WAL')
+            self._create(db)
+            yield db
+            db.commit()
+        finally:
+            db.close()
+
+    def _create(self, db):
+        import sqlite3
+        if db.execute('PRAGMA user_version').fetchone()[0] != self.SCHEMA:
+            db.executescript(f'''
+                DROP TABLE IF EXISTS items;
+                DROP TABLE IF EXISTS items_fts;
+                DROP TABLE IF EXISTS levels;
+                PRAGMA user_version = {self.SCHEMA};
+            ''')
+        db.executescript('''
+            CREATE TABLE IF NOT EXISTS items (
+                parent_id INTEGER, asset_id INTEGER, object_type TEXT, title TEXT, lead TEXT,
+                release_date_long INTEGER, position INTEGER, data TEXT, PRIMARY KEY (parent_id, asset_id));
+            CREATE INDEX IF NOT EXISTS items_parent ON items (parent_id, position);
+            CREATE TABLE IF NOT EXISTS levels (parent_id INTEGER PRIMARY KEY, updated REAL);
+        ''')
+        if self._fts is None:
+            try:
+                db.execute('CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(title, lead)')
+                self._fts = True
+            except sqlite3.OperationalError:
+                log.info('SQLite FTS5 is not available, use LIKE', title='TVP')
+                self._fts = False
+
+    def level(self, parent_id, *, ttl=None):
+        """Returns stored items of `parent_id` or None if level is missing or older then `ttl`."""
+        with self.connect() as db:
+            row = db.execute('SELECT updated FROM levels WHERE parent_id = ?', (parent_id,)).fetchone()
+            if row is None or (ttl is not None and row[0] < time.time() - ttl):
+                return None
+            return [json.loads(data) for data, in db.execute(
+                'SELECT data FROM items WHERE parent_id = ? ORDER BY position', (parent_id,))]
+
+    def _delete(self, db, parent_id):
+        """Remove all items of `parent_id` level."""
+        if self._fts:
+            db.execute('DELETE FROM items_fts WHERE rowid IN (SELECT rowid FROM items WHERE parent_id = ?)',
+                       (parent_id,))
+        db.execute('DELETE FROM items WHERE parent_id = ?', (parent_id,))
+
+    def _store(self, db, parent_id, items, *, full):
+        """Store (upsert) level items. New items of incremental update are placed first."""
+        if full:
+            self._delete(db, parent_id)
+            position = 0
+        else:
+            position = db.execute('SELECT MIN(position) FROM items WHERE parent_id = ?', (parent_id,)).fetchone()[0]
+            position = (position or 0) - len(items)
+        for n, item in enumerate(items):
+            iid = item.get('asset_id')
+            if iid is None:
+                continue
+            title, lead = item.get('title') or '', item.get('lead') or item.get('lead_root') or ''
+            values = (item.get('object_type'), title, lead, item.get('release_date_long'), position + n,
+                      json.dumps(item))
+            row = db.execute('SELECT rowid FROM items WHERE parent_id = ? AND asset_id = ?',
+                             (parent_id, iid)).fetchone()
+            if row is None:
+                rowid = db.execute('INSERT INTO items VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                   (parent_id, iid, *values)).lastrowid
+            else:
+                rowid = row[0]
+                db.execute('UPDATE items SET object_type = ?, title = ?, lead = ?, release_date_long = ?,'
+                           ' position = ?, data = ? WHERE rowid = ?', (*values, rowid))
+            if self._fts:
+                db.execute('DELETE FROM items_fts WHERE rowid = ?', (rowid,))
+                db.execute('INSERT INTO items_fts (rowid, title, lead) VALUES (?, ?, ?)', (rowid, title, lead))
+        db.execute('INSERT OR REPLACE INTO levels VALUES (?, ?)', (parent_id, time.time()))
+
+    def sync(self, site, root, *, filter=None, max_depth=4, batch=50, fresh=None, timeout=None, progress=None):
+        """
+        Mirror `root` directory tree (breadth-first, every asset once). Returns True if finished.
+
+        Levels stored less than `fresh` seconds ago are not fetched again (only expanded), so an interrupted
+        sync continues where it stopped. Older levels are updated incrementally (items newer than
+        the last `release_date_long`). `progress(depth, count)` is called for every batch, returns False to cancel.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        visited, frontier = {root}, [root]
+        for depth in range(max_depth):
+            next_frontier = []
+            for i in range(0, len(frontier), batch):
+                if deadline is not None and time.monotonic() > deadline:
+                    log.warning(f'VoD catalog sync timeout, depth {depth}', title='TVP')
+                    return False
+                if progress is not None and progress(depth, len(visited)) is False:
+                    return False
+                pids = frontier[i:i + batch]
+                with self.connect() as db:
+                    if fresh is not None:
+                        pids = [pid for pid in pids if (db.execute(
+                            'SELECT updated FROM levels WHERE parent_id = ?', (pid,)).fetchone() or (0,))[0]
+                            < time.time() - fresh]
+                    since = {pid: db.execute('SELECT MAX(release_date_long) FROM items WHERE parent_id = ?',
+                                             (pid,)).fetchone()[0] for pid in pids}
+                if pids:
+                    with site.concurrent() as con:
+                        for pid in pids:
+                            flt = dict(filter or {})
+                            if since[pid]:
+                                flt['release_date_long'] = {'$gt': since[pid]}
+                            con[pid].listing(pid, count=UNLIMITED, filter=flt)
+                with self.connect() as db:
+                    for pid in pids:
+                        self._store(db, pid, (con[pid] or {}).get('items') or (), full=not since[pid])
+                    for pid in frontier[i:i + batch]:
+                        for iid, in db.execute('SELECT asset_id FROM items WHERE parent_id = ? AND object_type'
+                                               ' NOT IN (\'video\', \'epg_item\')', (pid,)):
+                            if iid not in visited:
+                                visited.add(iid)
+                                next_frontier.append(iid)
+            frontier = next_frontier
+            if not frontier:
+                break
+        return True
+
+    def search(self, query, *, limit=200):
+        """Returns catalog items matching `query` (titles and leads), every asset once."""
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        with self.connect() as db:
+            if self._fts:
+                match = ' '.join(f'"{word}"*' for word in words)
+                rows = db.execute('SELECT items.asset_id, items.data FROM items_fts'
+                                  ' JOIN items ON items.rowid = items_fts.rowid'
+                                  ' WHERE items_fts MATCH ? ORDER BY rank', (match,))
+            else:
+                like = f'%{query}%'
+                rows = db.execute('SELECT asset_id, data FROM items WHERE title LIKE ? OR lead LIKE ?', (like, like))
+            found = {}
+            for iid, data in rows:
+                if iid not in found:
+                    found[iid] = json.loads(data)
+                    if len(found) >= limit:
+                        break
+            return list(found.values())
+
+
+class HttpCassette:
+    """
+    Record all HTTP traffic (`requests`) to a JSON-lines cassette or replay it without network.
+
+    Every line: method, url, params, status, headers and body (`"encoding": "base64"` if binary).
+    The same requests are replayed in recorded order (cyclic).
+    """
+
+    def __init__(self, path, *, mode):
+        self.path = Path(path)
+        self.mode = CassetteMode(mode)
+        self._records = None
+        self._next = {}
+        self._original = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method, url):
+        """Returns request key: method, host, path and sorted query."""
+        url = urlsplit(str(url))
+        query = urlencode(sorted(parse_qsl(url.query, keep_blank_values=True)))
+        return method.upper(), url.netloc.lower(), url.path, query
+
+    @property
+    def records(self):
+        with self._lock:
+            if self._records is None:
+                self._records = {}
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        for line in f:
+                            if line.strip():
+                                rec = json.loads(line)
+                                self._records.setdefault(self.key(rec['method'], rec['url']), []).append(rec)
+                except OSError as exc:
+                    log.warning(f'No cassette {self.path}: {exc}', title='TVP')
+            return self._records
+
+    def install(self):
+        """Hook `requests` (all sessions and `requests.get()`)."""
+        import requests
+        if self._original is not None:
+            return
+        original = self._original = requests.Session.request
+        cassette = self
+
+        def request(session, method, url, *args, **kwargs):
+            params = kwargs.get('params', args[0] if args else None)
+            full_url = requests.Request(method, url, params=params).prepare().url
+            if cassette.mode == CassetteMode.Replay:
+                return cassette.replay(method, full_url)
+            resp = original(session, method, url, *args, **kwargs)
+            if cassette.mode == CassetteMode.Record:
+                cassette.record(method, full_url, params, resp)
+            return resp
+
+        requests.Session.request = request
+        log(f'HTTP cassette {self.mode.name}: {self.path}', title='TVP')
+
+    def uninstall(self):
+        import requests
+        if self._original is not None:
+            requests.Session.request = self._original
+            self._original = None
+
+    def record(self, method, url, params, resp):
+        try:
+            body, encoding = resp.content.decode('utf-8'), None
+        except UnicodeDecodeError:
+            import base64
+            body, encoding = base64.b64encode(resp.content).decode('ascii'), 'base64'
+        rec = {'method': method.upper(), 'url': url, 'params': params if isinstance(params, Mapping) else None,
+               'status': resp.status_code, 'headers': dict(resp.headers), 'body': body}
+        if encoding:
+            rec['encoding'] = encoding
+        line = json.dumps(rec, default=str)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(f'{line}\n')
+
+    def find(self, method, url):
+        """Returns the next recorded response (dict) of the request or None. HEAD is served by GET record."""
+        key = self.key(method, url)
+        recs = self.records.get(key)
+        if not recs and key[0] == 'HEAD':
+            key = ('GET', *key[1:])
+            recs = self.records.get(key)
+        if not recs:
+            return None
+        with self._lock:
+            n = self._next.get(key, 0)
+            self._next[key] = n + 1
+        return recs[n % len(recs)]
+
+    def replay(self, method, url):
+        import base64
+        import requests
+        rec = self.find(method, url)
+        if rec is None:
+            raise requests.ConnectionError(f'Request {method} {url} is not in the cassette')
+        resp = requests.models.Response()
+        resp.status_code = rec['status']
+        resp._content = (base64.b64decode(rec['body']) if rec.get('encoding') == 'base64'
+                         else rec['body'].encode('utf-8'))
+        # body is stored decoded, recorded encoding and length don't match it
+        resp.headers = requests.structures.CaseInsensitiveDict({k: v for k, v in rec['headers'].items()
+                                                                if k.lower() not in ('content-encoding',
+                                                                                     'content-length')})
+        resp.headers['Content-Length'] = str(len(resp._content))
+        resp._content_consumed = True  # `iter_content()` (stream) serves the body too
+        resp.url = url
+        resp.request = requests.Request(method, url).prepare()
+        resp.reason = 'Replay'
+        return resp
+
+
+class RequestTrace:
+    """
+    Per-invocation trace of HTTP requests (`requests`) and cache lookups, saved as JSON lines.
+
+    The first line is an invocation summary, next are requests and cache records in order
+    and finally (if profiled) the top of the cProfile statistics.
+    """
+
+    #: Number of kept trace files.
+    KEEP = 50
+    #: Number of profile functions saved.
+    PROFILE_TOP = 40
+
+    def __init__(self, directory, *, route):
+        self.directory = Path(directory)
+        self.route = route
+        self.started = datetime.now()
+        self.records = []
+        self.profile = None
+        self.time = None
+        self._t0 = time.perf_counter()
+        self._original = None
+        self._lock = threading.Lock()
+
+    def add(self, type, **kwargs):
+        rec = {'type': type, 'at': round(time.perf_counter() - self._t0, 4),
+               'thread': threading.current_thread().name, **kwargs}
+        with self._lock:
+            self.records.append(rec)
+
+    def install(self):
+        """Hook `requests` (all sessions and `requests.get()`)."""
+        import requests
+        if self._original is not None:
+            return
+        original = self._original = requests.Session.request
+        trace = self
+
+        def request(session, method, url, *args, **kwargs):
+            params = kwargs.get('params', args[0] if args else None)
+            params = dict(params) if isinstance(params, Mapping) else params
+            parts = urlsplit(str(url))
+            endpoint = f'{parts.netloc}{parts.path}'
+            t0 = time.perf_counter()
+            try:
+                resp = original(session, method, url, *args, **kwargs)
+            except Exception as exc:
+                trace.add('http', method=method.upper(), endpoint=endpoint, params=params,
+                          time=round(time.perf_counter() - t0, 4), error=str(exc))
+                raise
+            if kwargs.get('stream'):
+                size = int(resp.headers.get('Content-Length') or 0)
+            else:
+                size = len(resp.content)
+            trace.add('http', method=method.upper(), endpoint=endpoint, params=params, status=resp.status_code,
+                      time=round(time.perf_counter() - t0, 4), bytes=size,
+                      cache='cassette' if resp.reason == 'Replay' else 'network')
+            return resp
+
+        requests.Session.request = request
+
+    def uninstall(self):
+        import requests
+        if self._original is not None:
+            requests.Session.request = self._original
+            self._original = None
+
+    def cache(self, name, key, status):
+        """Add cache lookup record, status is: hit, stale or miss."""
+        self.add('cache', name=name, key=str(key), status=status)
+
+    def start_profile(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def _profile_records(self):
+        import pstats
+        self.profile.disable()
+        stats = pstats.Stats(self.profile).stats
+        top = sorted(stats.items(), key=lambda it: it[1][3], reverse=True)[:self.PROFILE_TOP]
+        return [{'type': 'profile', 'func': f'{fname}:{line}({func})', 'calls': nc,
+                 'tottime': round(tt, 4), 'cumtime': round(ct, 4)}
+                for (fname, line, func), (cc, nc, tt, ct, callers) in top]
+
+    def save(self):
+        """Write trace file and remove the oldest ones."""
+        self.uninstall()
+        profile = self._profile_records() if self.profile is not None else []
+        with self._lock:
+            records = list(self.records)
+        http = [rec for rec in records if rec['type'] == 'http']
+        self.time = time.perf_counter() - self._t0
+        summary = {'type': 'invocation', 'route': self.route, 'started': f'{self.started:%Y-%m-%d %H:%M:%S}',
+                   'time': round(self.time, 4), 'requests': len(http),
+                   'bytes': sum(rec.get('bytes', 0) for rec in http),
+                   'network_time': round(sum(rec['time'] for rec in http), 4)}
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f'{self.started:%Y%m%d-%H%M%S}-{os.getpid()}.jsonl'
+            with open(path, 'w', encoding='utf-8') as f:
+                for rec in (summary, *records, *profile):
+                    f.write(f'{json.dumps(rec, default=str)}\n')
+            for old in sorted(self.directory.glob('*.jsonl'), reverse=True)[self.KEEP:]:
+                old.unlink()
+        except OSError as exc:
+            log.warning(f'Can not save trace: {exc}', title='TVP')
+
+    @classmethod
+    def load(cls, path):
+        """Returns all records of trace file, the first one is the invocation summary."""
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+class LatencyHistograms:
+    """
+    Rolling latency histograms (routes, endpoints) stored in compact JSON: `{key: {bucket: count}}`.
+
+    Buckets are logarithmic (`BASE` ratio, about 20% resolution), counts are halved when the total
+    exceeds `WINDOW`, so old samples fade out and percentiles follow the recent behavior.
+    """
+
+    BASE = 1.2
+    WINDOW = 500
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = {}
+
+    def load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.data = json.load(f)
+        except (OSError, ValueError):
+            self.data = {}
+        return self
+
+    def save(self):
+        dump_json(self.path, self.data, separators=(',', ':'))
+
+    @staticmethod
+    def route_key(path):
+        """Generalize path, numeric segments (IDs, dates) are replaced by `#`."""
+        return '/'.join('#' if seg.isdigit() else seg for seg in path.split('/')) or '/'
+
+    def add(self, key, seconds):
+        import math
+        hist = self.data.setdefault(key, {})
+        bucket = str(max(0, math.ceil(math.log(max(seconds * 1000, 1), self.BASE))))
+        hist[bucket] = hist.get(bucket, 0) + 1
+        if sum(hist.values()) > self.WINDOW:
+            self.data[key] = {b: n // 2 for b, n in hist.items() if n > 1}
+
+    def add_trace(self, trace):
+        """Add invocation time and all request latencies from RequestTrace."""
+        route = self.route_key(urlsplit(trace.route).path)
+        self.add(f'route:{route}', trace.time)
+        for rec in trace.records:
+            if rec['type'] == 'http' and rec.get('cache') == 'network':
+                self.add(f'endpoint:{self.route_key(rec["endpoint"])}', rec['time'])
+        return self
+
+    def count(self, key):
+        return sum(self.data.get(key, {}).values())
+
+    def percentile(self, key, q):
+        """Returns `q` (0..1) percentile in milliseconds (bucket upper bound)."""
+        hist = sorted((int(b), n) for b, n in self.data.get(key, {}).items())
+        rank = q * sum(n for b, n in hist)
+        total = 0
+        for bucket, n in hist:
+            total += n
+            if total >= rank:
+                return self.BASE ** bucket
+        return 0
+
+    def slowest(self, kind):
+        """Returns [(name, p50, p95, p99, count)] of `kind` (route, endpoint), sorted by p95."""
+        stats = [(key.partition(':')[2], *(self.percentile(key, q) for q in (.5, .95, .99)), self.count(key))
+                 for key in self.data if key.startswith(f'{kind}:')]
+        return sorted(stats, key=lambda st: st[2], reverse=True)
+
+
 class TvpVodSite(Site):
     """vod.tvp.pl site."""
 
@@ -230,10 +1119,51 @@ class TvpVodSite(Site):
 class TvpSite(Site):
     """TVP API."""
 
+    HBB_GRAPHQL = 'https://hbb-prod.tvp.pl/apps/manager/api/hub/graphql'
+
     def __init__(self, base='https://www.api.v3.tvp.pl/', *args, count=None, verify_ssl=False, **kwargs):
         super().__init__(base, *args, verify_ssl=verify_ssl, **kwargs)
         self.count = count
         self.dT = timedelta(minutes=5)  # time epsilon (extend filter time range)
+        self.epg_indexes = []  # callables returning indexes (e.g. CatchupIndex) updated by every `station_epg()`
+        self.epg_overlap = timedelta(hours=6)  # programs from previous day could cover early hours
+        self.epg_memo_ttl = 300  # how long (seconds) fetched channel-date EPG is reused
+        self._epg_memo = {}
+        self.caches = None  # cache factory `caches(name, ttl=None)` returning JsonCache, see `vod_cache`
+        self.vod_product_ttl = 3600
+        self.vod_playlist_ttl = 5 * 60  # playlist URLs are valid for short time only
+        self.hbb_persisted = True  # try GraphQL persisted queries (hash only) first
+        self.hbb_apq_ttl = 24 * 3600  # how long a persisted query miss is remembered (full queries only)
+        self.cassette = None  # HttpCassette in record or replay mode
+        self.trace = None  # RequestTrace of the current invocation (debugging)
+        self.listing_stream = True  # decode huge unlimited listing items from the response stream
+        self.listing_stream_size = 1024 * 1024  # smaller responses (bytes read) are decoded at once
+        self.listing_chunk_size = 64 * 1024
+
+    @property
+    def vod_cache(self):
+        """JsonCache for VoD products and playlists (None if there is no cache factory)."""
+        return None if self.caches is None else self.caches('vod')
+
+    @property
+    def hbb_cache(self):
+        """JsonCache remembering a persisted query miss (skip them for `hbb_apq_ttl`)."""
+        return None if self.caches is None else self.caches('hbb_apq')
+
+    def use_cassette(self, path, *, mode=CassetteMode.Record):
+        """Record all requests to cassette `path` or replay them (no network access)."""
+        if self.cassette is not None:
+            self.cassette.uninstall()
+        self.cassette = None
+        if mode != CassetteMode.Off:
+            self.cassette = HttpCassette(path, mode=mode)
+            self.cassette.install()
+        return self.cassette
+
+    def trace_cache(self, name, key, status):
+        """Notify the trace (if any) about cache lookup."""
+        if self.trace is not None:
+            self.trace.cache(name, key, status)
 
     def listing(self, parent_id, *, dump='json', direct=True, **kwargs):
         count = kwargs.pop('count', self.count)
@@ -241,14 +1171,58 @@ class TvpSite(Site):
             count = ''
         if kwargs.get('page', ...) is None:
             kwargs.pop('page')
-        return self.jget('/shared/listing.php',
+        data = self.jget('/shared/listing.php',
                          params={'dump': dump, 'direct': direct, 'count': count, 'parent_id': parent_id, **kwargs})
+        if kwargs.get('filter') and data.get('items') is None:
+            # server rejected the filter, get the full list (caller has to filter it)
+            log.warning(f'listing({parent_id}): filter {kwargs["filter"]!r} rejected', title='TVP')
+            kwargs.pop('filter')
+            data = self.jget('/shared/listing.php',
+                             params={'dump': dump, 'direct': direct, 'count': count, 'parent_id': parent_id, **kwargs})
+        return data
 
     def listing_items(self, parent_id, *, dump='json', direct=True, **kwargs):
+        count = kwargs.get('count', self.count)
+        if self.listing_stream and count is UNLIMITED and kwargs.get('page') is None:
+            # whole (possibly huge) directory
+            kwargs.pop('count', None)
+            kwargs.pop('page', None)
+            params = {'dump': dump, 'direct': direct, 'count': '', 'parent_id': parent_id, **kwargs}
+            # plain `get()`, structured arguments (`filter`, `order`) have to be sent as JSON
+            params = {k: json.dumps(v) if isinstance(v, (Mapping, list)) else v for k, v in params.items()}
+            resp = self.get('/shared/listing.php', stream=True, params=params)
+            try:
+                # read up to `listing_stream_size` first (Content-Length is missing if chunked or compressed)
+                stream = resp.iter_content(self.listing_chunk_size)
+                head, size = [], 0
+                for chunk in stream:
+                    head.append(chunk)
+                    size += len(chunk)
+                    if size > self.listing_stream_size:
+                        break
+                if size > self.listing_stream_size:
+                    # decode items one by one from the response stream (slower, but only one item in memory)
+                    import codecs
+                    decoder = codecs.getincrementaldecoder('utf-8')()
+                    chunks = (decoder.decode(chunk) for chunk in chain(head, stream))
+                    found = yield from iter_json_items(chunks)
+                else:
+                    items = json_loads()(b''.join(head)).get('items')
+                    found = items is not None
+                    yield from items or ()
+            finally:
+                resp.close()
+            if found:
+                return
+            # no items (e.g. server rejected the filter), `listing()` handles it
         data = self.listing(parent_id, dump=dump, direct=direct, **kwargs)
         for item in data.get('items') or ():
             yield item
 
+    def listing_all(self, parent_id, **kwargs):
+        """Returns list of all `parent_id` items (streamed decoding), for concurrent calls."""
+        return list(self.listing_items(parent_id, count=UNLIMITED, **kwargs))
+
     # Dicts `filter` and `order` could be in arguments because they are read-only.
     def transmissions(self, parent_id, *, dump='json', direct=False, type='epg_item',
                       filter_dict={'is_live': True}, order={'release_date_long': -1}, **kwargs):
@@ -266,6 +1240,46 @@ class TvpSite(Site):
         # reverse reversed ('release_date_long': -1) list
         return reversed(data.get('items') or ())
 
+    def crawl(self, root, *, leaf, max_depth=None, max_fanout=None, max_nodes=None, timeout=None, batch=50):
+        """
+        Breadth-first `listing` crawler. Yields `leaf(item)` items as soon as every batch of listings is received.
+
+        Every `asset_id` is visited once (safe on cyclic parents). Crawl is limited by
+        `max_depth` levels, `max_fanout` children of a node, `max_nodes` listed nodes and `timeout` seconds
+        (checked before every batch of at most `batch` concurrent listings).
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        visited, frontier, depth, nodes = {root}, [root], 0, 0
+        while frontier:
+            if max_nodes is not None:
+                frontier = frontier[:max(0, max_nodes - nodes)]
+            level, frontier = frontier, []
+            for i in range(0, len(level), batch):
+                if deadline is not None and time.monotonic() > deadline:
+                    log.warning(f'crawl({root}): timeout, {nodes} nodes, depth {depth}', title='TVP')
+                    return
+                pids = level[i:i + batch]
+                nodes += len(pids)
+                with self.concurrent() as con:
+                    for pid in pids:
+                        con.listing_all(pid)
+                for items in con:
+                    children = []
+                    for item in items or ():
+                        iid = item.get('asset_id')
+                        if iid is not None:
+                            if iid in visited:
+                                continue
+                            visited.add(iid)
+                        if leaf(item):
+                            yield item
+                        elif iid is not None:
+                            children.append(iid)
+                    frontier.extend(children[:max_fanout])
+            depth += 1
+            if max_depth is not None and depth >= max_depth:
+                break
+
     def details(self, object_id, *, dump='json', **kwargs):
         return self.jget('/shared/details.php',
                          params={'dump': dump, 'object_id': object_id, **kwargs})
@@ -278,11 +1292,58 @@ class TvpSite(Site):
             date = datetime.now()
         if not isinstance(date, str):
             date = f'{date:%Y-%m-%d}'
-        return self.jget('https://tvpstream.tvp.pl/api/tvp-stream/program-tv/index', params={
+        # the same channel-date is fetched once and reused by all callers
+        key = None if kwargs else (station_code, date)
+        memo = self._epg_memo.get(key)
+        if memo and memo[0] > time.time() - self.epg_memo_ttl:
+            self.trace_cache('epg', key, 'hit')
+            return memo[1]
+        data = self.jget('https://tvpstream.tvp.pl/api/tvp-stream/program-tv/index', params={
             'station_code': station_code,
             'date': date,
             **kwargs,
         }).get('data') or ()
+        if key is not None:
+            self._epg_memo[key] = (time.time(), data)
+        for index in self.epg_indexes:
+            index().update(station_code, data)
+        return data
+
+    def _epg_dates(self, start, end):
+        """Returns EPG dates (str) covering `start`..`end` time range."""
+        first = (start - self.epg_overlap).date()
+        return [f'{first + timedelta(days=n):%Y-%m-%d}' for n in range((end.date() - first).days + 1)]
+
+    def stations_epg_range(self, station_codes, start, end=None):
+        """EPG for many stations, returns `{code: ChannelEpg}`. All channel-dates are fetched concurrently."""
+        if end is None:
+            end = start
+        with self.concurrent() as con:
+            for code in station_codes:
+                for date in self._epg_dates(start, end):
+                    con.station_epg(code, date)
+        # all channel-dates are memoized now
+        return {code: self.station_epg_range(code, start, end) for code in station_codes}
+
+    def station_epg_range(self, station_code, start, end=None):
+        """
+        EPG for programs overlapping `start`..`end` time range (could be many days).
+
+        All covered dates are fetched concurrently, programs are deduplicated by `record_id`.
+        """
+        if end is None:
+            end = start
+        dates = self._epg_dates(start, end)
+        with self.concurrent() as con:
+            for date in dates:
+                con[date].station_epg(station_code, date)
+        start_ms, end_ms = start.timestamp() * 1000, end.timestamp() * 1000
+        progs = {}
+        for date in dates:
+            for item in con[date] or ():
+                if item['date_end'] > start_ms and item['date_start'] <= end_ms:
+                    progs.setdefault(item.get('record_id') or (item['date_start'], item.get('title')), item)
+        return ChannelEpg(sorted(progs.values(), key=lambda item: item['date_start']))
 
     def station_full_epg(self, station_code, date=None, **kwargs):
         epg = ChannelEpg(self.station_epg(station_code, date))
@@ -336,12 +1397,128 @@ class TvpSite(Site):
                                  **kwargs})
 
     def trailer(self, id: PathArg[id]):
-        data = self.jget(f'https://vod.tvp.pl/api/products/{id}/videos/playlist', params={
+        return self.vod_playlist(id, 'TRAILER').data
+
+    @staticmethod
+    def _hbb_operation(query, variables=None, operation=None, *, full=True):
+        """GraphQL operation with persisted query hash (and full query text if `full`)."""
+        import hashlib
+        op = {
+            'operationName': operation,
+            'variables': variables or {},
+            'extensions': {
+                'persistedQuery': {
+                    'version': 1,
+                    'sha256Hash': hashlib.sha256(query.encode('utf-8')).hexdigest(),
+                },
+            },
+        }
+        if full:
+            op['query'] = query
+        return op
+
+    @staticmethod
+    def _hbb_need_query(resp):
+        """True if server needs full query text (persisted query not found or not supported)."""
+        return not isinstance(resp, Mapping) or (not resp.get('data') and bool(resp.get('errors')))
+
+    def _hbb_apq(self):
+        """True if persisted queries (hash only) should be tried."""
+        return self.hbb_persisted and (self.hbb_cache is None
+                                       or self.hbb_cache.expired('apq_miss', ttl=self.hbb_apq_ttl))
+
+    def _hbb_apq_miss(self):
+        """Skip persisted queries (for `hbb_apq_ttl`), send the full query text only."""
+        self.hbb_persisted = False
+        if self.hbb_cache is not None:
+            self.hbb_cache.set('apq_miss', True)
+
+    def _hbb_post(self, payload):
+        """POST GraphQL payload, returns None on error (e.g. HTTP 400 PersistedQueryNotFound)."""
+        try:
+            return self.jpost(self.HBB_GRAPHQL, json=payload)
+        except Exception as exc:
+            log.info(f'HBB persisted query failed: {exc}', title='TVP')
+            return None
+
+    def hbb_api(self, query, variables=None, operation=None):
+        """HBB GraphQL request. Persisted query hash is sent first, full query text if server doesn't know it."""
+        if self._hbb_apq():
+            resp = self._hbb_post(self._hbb_operation(query, variables, operation, full=False))
+            if not self._hbb_need_query(resp):
+                return resp
+            self._hbb_apq_miss()
+        return self.jpost(self.HBB_GRAPHQL, json=self._hbb_operation(query, variables, operation))
+
+    def hbb_batch(self, operations):
+        """
+        Many HBB GraphQL operations `[(query, variables, operation)]` in one POST, returns list of responses.
+
+        Operations unknown as persisted queries are sent again (with full query text) in one more POST.
+        Falls back to single requests if server does not support batching.
+        """
+        operations = [tuple(op) for op in operations]
+        if not operations:
+            return []
+        full = not self._hbb_apq()
+        payload = [self._hbb_operation(*op, full=full) for op in operations]
+        resp = self._hbb_post(payload) if not full else self.jpost(self.HBB_GRAPHQL, json=payload)
+        if not isinstance(resp, list) or len(resp) != len(operations):
+            return [self.hbb_api(*op) for op in operations]
+        retry = [i for i, r in enumerate(resp) if self._hbb_need_query(r)]
+        if retry:
+            if not full:
+                self._hbb_apq_miss()
+            again = self.jpost(self.HBB_GRAPHQL, json=[self._hbb_operation(*operations[i]) for i in retry])
+            if isinstance(again, list) and len(again) == len(retry):
+                for i, r in zip(retry, again):
+                    resp[i] = r
+        return resp
+
+    def vod_seasons(self, serial_id):
+        return self.jget(f'https://vod.tvp.pl/api/products/vods/serials/{serial_id}/seasons', params={
+            'lang': 'pl',
+            'platform': 'BROWSER'
+        })
+
+    def vod_episodes(self, serial_id, season_id):
+        return self.jget(f'https://vod.tvp.pl/api/products/vods/serials/{serial_id}/seasons/{season_id}/episodes',
+                         params={
+                             'lang': 'pl',
+                             'platform': 'BROWSER'
+                         })
+
+    def vod_product(self, id):
+        """VoD product (cached in `vod_cache`)."""
+        key = f'product:{id}'
+        data = None if self.vod_cache is None else self.vod_cache.get(key, ttl=self.vod_product_ttl)
+        self.trace_cache('vod', key, 'miss' if data is None else 'hit')
+        if data is None:
+            data = self.jget(f'https://vod.tvp.pl/api/products/vods/{id}', params={
+                'lang': 'pl',
+                'platform': 'BROWSER'
+            })
+            if self.vod_cache is not None and data.get('id'):
+                self.vod_cache.set(key, data)
+        return VodProduct.parse(data)
+
+    def vod_playlist(self, id, video_type='MOVIE', *, refresh=False):
+        """VoD product playlist (cached in `vod_cache` while its URLs are valid)."""
+        key = f'playlist:{video_type}:{id}'
+        data = None
+        if self.vod_cache is not None and not refresh:
+            data = self.vod_cache.get(key, ttl=self.vod_playlist_ttl)
+        self.trace_cache('vod', key, 'miss' if data is None else 'hit')
+        if data is None:
+            data = self.jget(f'https://vod.tvp.pl/api/products/{id}/videos/playlist', params={
                 'lang': 'pl',
                 'platform': 'BROWSER',
-                'videoType': 'TRAILER'
-        })
-        return data
+                'videoType': video_type,
+            })
+            if self.vod_cache is not None and data.get('sources'):
+                self.vod_cache.set(key, data)
+                self.vod_cache.purge(ttl=max(self.vod_product_ttl, self.vod_playlist_ttl))
+        return VodPlaylist.parse(id, video_type, data)
 
     def vod_search_data(self, query, s_type):
         if s_type == 'movie':
@@ -377,10 +1554,13 @@ class TvpPlugin(Plugin):
             Menu(call='tv_stations'),
             Menu(call='tv_html'),
             Menu(call='tv_tree'),
+            Menu(call='traces'),
+            Menu(call='latency'),
         ]),
         Menu(title=L(30105, 'TV'), items=[
             Menu(call='tv'),
             Menu(call='tv_program'),
+            Menu(call='tv_at'),
             Menu(call='replay_list'),
         ]),
         MenuItems(id=1785454, type='directory_series', order={2: 'programy', 1: 'seriale', -1: 'teatr*'}),
@@ -398,8 +1578,11 @@ class TvpPlugin(Plugin):
             Menu(title=L(30118, 'EuroParliament'), id=4615555),
         ]),
         Menu(title=lang_text.search, items=[
+            Menu(title=L(30188, 'All services'), call='all_search'),
             Menu(title='TVP VOD', call='vod_search'),
+            Menu(title=L(30190, 'TVP VOD (offline)'), call='catalog_search', when='vod_catalog'),
             Menu(title='TVP GO', call='search'),
+            Menu(title=L(30187, 'EPG (offline)'), call='epg_search'),
         ]),
         # Menu(call='settings'),
     ])
@@ -443,14 +1626,80 @@ class TvpPlugin(Plugin):
         'obsada',
         'tworcy'
     }
+
+    # Server-side `listing.php` filter, the same as TYPES_ALLOWED and NOT_ALLOWED.
+    # Server could ignore it, then `allowed_items()` filters on the client side.
+    LISTING_FILTER = {
+        'object_type': {'$in': sorted(TYPES_ALLOWED)},
+        'web_name': {'$nin': sorted(NOT_ALLOWED)},
+    }
+
     vod_search = subobject()
+    catalog_search = subobject()
+    all_search = subobject()
+    epg_search = subobject()
+
+    #: Time (in seconds) of expanded `MenuItems` validity and its background refresh.
+    MENU_TTL = 30 * 24 * 3600
+    MENU_REFRESH = 24 * 3600
+    #: Time (in seconds) of station list validity and its background refresh.
+    STATIONS_TTL = 7 * 24 * 3600
+    STATIONS_REFRESH = 24 * 3600
+    #: Retry time (in seconds) of now/next snapshot for a channel without EPG.
+    NOW_NEXT_RETRY = 15 * 60
+    #: Time (in seconds) of cached EPG occurrence details (archive window).
+    OCCURRENCE_TTL = 8 * 24 * 3600
+    #: Time (in seconds) after EPG search index is updated (all stations ± 7 days) in background.
+    EPG_SEARCH_REFRESH = 24 * 3600
+    EPG_SEARCH_DAYS = 7
+    EPG_SEARCH_STEP = 4  # background update step, less than BACKGROUND_WAIT
+    #: Time (in seconds) of cached transmission list of a virtual channel.
+    TRANSMISSIONS_TTL = 5 * 60
+    #: TV tree crawler: root, limits (depth, node fan-out, listed nodes, seconds) and persisted map TTL and refresh.
+    TV_TREE_ROOT = 68970
+    TV_TREE_DEPTH = 6
+    TV_TREE_FANOUT = 200
+    TV_TREE_NODES = 2000
+    TV_TREE_TIMEOUT = 60
+    TV_TREE_TTL = 30 * 24 * 3600
+    TV_TREE_REFRESH = 7 * 24 * 3600
+    #: VoD search types (with labels) and time (in seconds) of cached results.
+    VOD_SEARCH_TYPES = (('movie', 'Filmy'), ('serial', 'Seriale'), ('episode', 'Odcinki'))
+    VOD_SEARCH_TTL = 3600
+    #: Time (in seconds) of cached VoD serial data.
+    VOD_TTL = 3600
+    #: Time (in seconds) background threads (refresh, prefetch) could run after the directory is sent.
+    BACKGROUND_WAIT = 5
+    #: Global deadline (in seconds) of federated search (all services).
+    ALL_SEARCH_TIMEOUT = 8
+    #: Days back (catch-up) offered by "What's on at…".
+    TV_AT_DAYS_BACK = 7
+    #: Local VoD catalog: root, levels validity and background sync (in seconds).
+    VOD_CATALOG_ROOT = 1785454
+    VOD_CATALOG_TTL = 7 * 24 * 3600
+    VOD_CATALOG_REFRESH = 24 * 3600
+    VOD_CATALOG_TIMEOUT = 10 * 60
+    VOD_CATALOG_STEP = 4  # background sync step, less than BACKGROUND_WAIT
+    #: M3U format version, change it to force playlist regeneration.
+    M3U_VERSION = 1
+    #: XMLTV export range: catch-up days back and days ahead.
+    XMLTV_DAYS_BACK = 7
+    XMLTV_DAYS_AHEAD = 1
 
     # epg_url = ('http://www.tvp.pl/shared/programtv-listing.php?station_code={code}&count=100&filter=[]&'
     #            'template=json%2Fprogram_tv%2Fpartial%2Foccurrences-full.html&today_from_midnight=1&date=2022-04-25')
 
     def __init__(self):
         super().__init__()
+        self._caches = {}  # see `cache()`
+        self._lazy_lock = threading.Lock()  # caches and indexes are created on first use (also in threads)
         self.site = TvpSite()
+        self.site.caches = self.cache
+        if self.settings.http_cassette:
+            self.site.use_cassette(self.profile_path / 'cassettes' / 'session.jsonl', mode=self.settings.http_cassette)
+        self._catchup_index = self._epg_search_index = self._vod_catalog = None  # created on first use
+        self.site.epg_indexes.append(lambda: self.catchup_index)
+        self._background = []  # background threads, see `background()`
         self.colors['spec'] = 'gold'
         self.formatter.default_formats.update({
             'prog.date': '%Y.%m.%d',
@@ -485,8 +1734,95 @@ class TvpPlugin(Plugin):
             'folder_list_separator': ['COLOR khaki', 'B', 'I'],
         })
         self.vod_search = Search(addon=self, site=self.site, name='vod', method=self.vod_search_folder)
+        self.catalog_search = Search(addon=self, site=self.site, name='catalog', method=self.catalog_search_folder)
+        self.all_search = Search(addon=self, site=self.site, name='all', method=self.all_search_folder)
+        self.epg_search = Search(addon=self, site=self.site, name='epg', method=self.epg_search_folder)
+
+    @property
+    def catchup_index(self):
+        with self._lazy_lock:
+            if self._catchup_index is None:
+                self._catchup_index = CatchupIndex(self.profile_path / 'catchup')
+            return self._catchup_index
+
+    @property
+    def epg_search_index(self):
+        with self._lazy_lock:
+            if self._epg_search_index is None:
+                self._epg_search_index = EpgSearchIndex(self.profile_path / 'epgsearch')
+            return self._epg_search_index
+
+    @property
+    def vod_catalog(self):
+        with self._lazy_lock:
+            if self._vod_catalog is None:
+                self._vod_catalog = VodCatalog(self.profile_path / 'vod_catalog.db')
+            return self._vod_catalog
+
+    def cache(self, name, *, ttl=None):
+        """Returns persistent cache `name` from the profile folder."""
+        with self._lazy_lock:
+            try:
+                return self._caches[name]
+            except KeyError:
+                cache = self._caches[name] = JsonCache(self.profile_path / 'cache' / f'{name}.json', ttl=ttl)
+                return cache
+
+    def cached(self, name, key, fetch, *, ttl, refresh=None):
+        """
+        Returns cached data or call `fetch()` and cache the result.
+
+        Data older then `refresh` (if not None) but still valid (younger then `ttl`)
+        is returned immediately and refreshed in background thread.
+        """
+        cache = self.cache(name)
+        if cache.expired(key, ttl=ttl):
+            self.site.trace_cache(name, key, 'miss')
+            return cache.set(key, fetch())
+        if refresh is not None and cache.expired(key, ttl=refresh):
+            self.site.trace_cache(name, key, 'stale')
+            self.background(lambda: cache.set(key, fetch()), name=f'refresh-{name}[{key}]')
+        else:
+            self.site.trace_cache(name, key, 'hit')
+        return cache.get(key, ttl=None)
+
+    def run(self, *args, **kwargs):
+        """
+        Run plugin. Trace all requests if debugging, profile the entry point if developing too.
+
+        Background threads get `BACKGROUND_WAIT` seconds after the entry point is done,
+        then the HTTP cassette (if any) is uninstalled.
+        """
+        try:
+            self._run(*args, **kwargs)
+        finally:
+            self.background_wait(self.BACKGROUND_WAIT)
+            # `requests` survives the invocation (reused language invoker), remove the hook
+            if self.site.cassette is not None:
+                self.site.cassette.uninstall()
+
+    def _run(self, *args, **kwargs):
+        if not self.settings.debugging:
+            return super().run(*args, **kwargs)
+        route = urlsplit(sys.argv[0]).path + (sys.argv[2] if len(sys.argv) > 2 else '')
+        trace = self.site.trace = RequestTrace(self.profile_path / 'traces', route=route)
+        trace.install()
+        if self.settings.developing:
+            trace.start_profile()
+        try:
+            return super().run(*args, **kwargs)
+        finally:
+            self.site.trace = None
+            trace.save()
+            try:
+                LatencyHistograms(self.profile_path / 'latency.json').load().add_trace(trace).save()
+            except OSError as exc:
+                log.warning(f'Can not save latency: {exc}', title='TVP')
 
     def home(self):
+        if self.settings.vod_catalog and self.cache('vod_catalog').expired('synced', ttl=self.VOD_CATALOG_REFRESH):
+            # a short sync step only, full sync is the settings action (`vod_catalog_sync`)
+            self.background(partial(self.vod_catalog_refresh, timeout=self.VOD_CATALOG_STEP), name='vod-catalog')
         self.menu()
         # with self.directory() as kdir:
         #     kdir.menu(L('Tests'), self.tests)
@@ -511,9 +1847,14 @@ class TvpPlugin(Plugin):
             return kdir.menu(entry.title, call(self.listing, entry.id))
 
     def menu_entry_iter(self, *, entry):
-        for it in self.site.listing_items(entry.id):
-            if not entry.type or it.get('object_type') == entry.type:
-                yield it
+        def fetch():
+            kwargs = {'filter': {'object_type': entry.type}} if entry.type else {}
+            return [it for it in self.site.listing_items(entry.id, **kwargs)
+                    if not entry.type or it.get('object_type') == entry.type]
+
+        # Main menu is almost static, use cached list and refresh it once a day in background.
+        yield from self.cached('menu', f'{entry.id}:{entry.type or ""}', fetch, ttl=self.MENU_TTL,
+                               refresh=self.MENU_REFRESH)
 
     def menu_entry_item(self, *, kdir, entry, item, index_path):
         return self._item(kdir, item)
@@ -523,17 +1864,73 @@ class TvpPlugin(Plugin):
         label, _, label2 = self.formatter.format(format, **kwargs).partition('||')
         return label, label2 or None
 
+    def allowed_items(self, data, *, id=None):
+        """Returns allowed listing items. Filter on client side if server ignored `LISTING_FILTER`."""
+        items = data.get('items') or ()
+        allowed, skipped = [], []
+        for item in items:
+            if item.get('object_type') in self.TYPES_ALLOWED and item.get('web_name') not in self.NOT_ALLOWED:
+                allowed.append(item)
+            else:
+                skipped.append(item)
+        if self.settings.debugging and skipped:
+            # server filter was ignored (or incomplete) for these items
+            size, unfiltered = len(json.dumps(items)), len(json.dumps(skipped))
+            log(f'listing({id}): {len(items)} items received ({size} bytes), {len(skipped)} of them'
+                f' ({unfiltered} bytes) passed the server filter and were skipped on client side', title='TVP')
+        return allowed
+
+    def vod_catalog_refresh(self, *, timeout, progress=None):
+        """Sync VoD catalog (continues interrupted sync). Returns True if finished."""
+        done = self.vod_catalog.sync(self.site, self.VOD_CATALOG_ROOT, filter=self.LISTING_FILTER,
+                                     fresh=self.VOD_CATALOG_REFRESH, timeout=timeout, progress=progress)
+        if done:
+            self.cache('vod_catalog').set('synced', True)
+        return done
+
+    def vod_catalog_sync(self):
+        """Full VoD catalog sync with progress dialog (settings action)."""
+        dialog = xbmcgui.DialogProgress()
+        dialog.create(L(30200, 'Synchronize VoD catalog now'))
+
+        def progress(depth, count):
+            dialog.update(min(100, 25 * depth), f'{count}')
+            return not dialog.iscanceled()
+
+        try:
+            done = self.vod_catalog_refresh(timeout=self.VOD_CATALOG_TIMEOUT, progress=progress)
+        finally:
+            dialog.close()
+        if done:
+            xbmcgui.Dialog().notification('[B]TVP[/B]', L(30201, 'VoD catalog synchronized'), xbmcgui.NOTIFICATION_INFO)
+
+    def catalog_search_folder(self, query):
+        """Search in local VoD catalog (no network access)."""
+        with self.directory() as kdir:
+            for item in self.allowed_items({'items': self.vod_catalog.search(query)}):
+                self._item(kdir, item)
+
     def listing(self, id: PathArg[int], page=None, vid_type=None):
         """Use api.v3.tvp.pl JSON listing."""
         per_page = self.settings.per_page_limit  # liczba video na stronę
         # PAGE = None # wszystko na raz na stronie
 
-        # TODO:  determine `view`
-        with self.site.concurrent() as con:
-            con.a.data.listing(id, count=per_page, page=page)
-            con.a.details.details(id)
-        data = con.a.data
-        details = con.a.details
+        data = None
+        if self.settings.vod_catalog and page is None and vid_type is None:
+            # level mirrored in local VoD catalog, used only if the live listing would not be paged
+            items = self.vod_catalog.level(id, ttl=self.VOD_CATALOG_TTL)
+            if items and (not per_page or len(items) <= per_page):
+                data, details = {'items': items, 'total_count': len(items)}, {}
+        if data is None:
+            # TODO:  determine `view`
+            with self.site.concurrent() as con:
+                if per_page:
+                    con.a.data.listing(id, count=per_page, page=page, filter=self.LISTING_FILTER)
+                else:
+                    con.a.data.listing_all(id, filter=self.LISTING_FILTER)
+                con.a.details.details(id)
+            data = con.a.data if per_page else {'items': con.a.data}
+            details = con.a.details
         etype = details.get('object_type')
 
         with self.directory(view='movies') as kdir:
@@ -548,8 +1945,7 @@ class TvpPlugin(Plugin):
             #     if parents:
             #         kdir.menu('^^^', call(self.listing, id=parents[0]))  # XXX DEBUG
 
-            items = [item for item in items if
-                     item.get('object_type') in self.TYPES_ALLOWED and item.get('web_name') not in self.NOT_ALLOWED]
+            items = self.allowed_items(data, id=id)
 
             if len(items) == 1 and items[0]['web_name'] == 'wideo':
                 # Oszukany katalog sezonu, pokaż od razu odcinki.
@@ -605,12 +2001,10 @@ class TvpPlugin(Plugin):
             # Zwykłe katalogi (albo odcinki bezpośrednio z szukanego).
             if vid_type == 'website':
                 with self.site.concurrent() as con:
-                    con.a.data.listing(id)
+                    con.a.data.listing_all(id, filter=self.LISTING_FILTER)
                     con.a.details.details(id)
-                data = con.a.data
-                items = [item for item in data['items']
-                         if (item.get('object_type') in self.TYPES_ALLOWED
-                             and item.get('web_name') not in self.NOT_ALLOWED)]
+                data = {'items': con.a.data}
+                items = self.allowed_items(data, id=id)
                 a_id = items[0]['asset_id']
                 items = self.site.listing(a_id, count=per_page, page=page).get('items')
                 for item in items:
@@ -633,31 +2027,61 @@ class TvpPlugin(Plugin):
         51696825,  # TVP Rozrywka
     ]
 
-    def channel_iter_stations(self, *, epg=False, now=None):
-        """TV channel list."""
-        # Regionalne: 38345166 → vortal → virtual_channel → live_video_id
-        stations = self.site.stations()
-        epgs = {}
-        if epg:
-            if now is None:
-                now = datetime.now()
+    def stations(self):
+        """Cached TV station list (changes very rarely)."""
+        return self.cached('stations', 'stations', self.site.stations, ttl=self.STATIONS_TTL,
+                           refresh=self.STATIONS_REFRESH)
+
+    def now_next(self, stations, *, now=None):
+        """
+        Returns now/next EPG snapshot `{code: ChannelEpg}` for `stations`.
+
+        Snapshot of every channel expires when its current program ends,
+        so only channels whose program rolled over are fetched again.
+        """
+        if now is None:
+            now = datetime.now()
+        stamp = now.timestamp()
+        cache = self.cache('nownext')
+        snapshot = {code: cache.get(code, ttl=None) for code in (item.get('code') for item in stations) if code}
+        expired = [code for code, rec in snapshot.items() if not rec or rec['expires'] <= stamp]
+        if expired:
             with self.site.concurrent() as con:
-                for item in stations:
-                    code = item.get('code')
-                    if code:
-                        con[code].station_epg(code, date=now)
-            epgs = {code: ChannelEpg(epg) for code, epg in con.items()}
+                for code in expired:
+                    con[code].station_epg(code, date=now)
+            epgs = {code: ChannelEpg(con[code], now=now) for code in expired}
             with self.site.concurrent() as con:
                 for prog in epgs.values():
                     cur = prog.current
-                    if cur:
+                    if cur and cur.get('id'):
                         con[cur.id].occurrence(cur.id)
-            for prog in epgs.values():
-                cur = prog.current
+            for code, prog in epgs.items():
+                cur, nxt = prog.current, prog.next
+                current = None
                 if cur:
-                    if cur.get('data'):
-                        prog._current = ChannelProgram(
-                            {**con[cur.id]['data'], 'date_start': cur['date_start'], 'date_end': cur['date_end']})
+                    occ = (con[cur.id] if cur.get('id') else None) or {}
+                    if occ.get('data'):
+                        current = {**occ['data'], 'date_start': cur['date_start'], 'date_end': cur['date_end']}
+                    else:
+                        current = dict(cur)
+                    expires = cur['date_end'] / 1000
+                elif nxt:
+                    expires = nxt['date_start'] / 1000
+                else:
+                    expires = stamp + self.NOW_NEXT_RETRY
+                snapshot[code] = cache.set(code, {'current': current, 'next': dict(nxt) if nxt else None,
+                                                  'expires': expires}, save=False)
+            cache.save()
+        return {code: ChannelEpg((prog for prog in (rec['current'], rec['next']) if prog), now=now)
+                for code, rec in snapshot.items()}
+
+    def channel_iter_stations(self, *, epg=False, now=None):
+        """TV channel list."""
+        # Regionalne: 38345166 → vortal → virtual_channel → live_video_id
+        stations = self.stations()
+        epgs = {}
+        if epg:
+            epgs = self.now_next(stations, now=now)
         for item in stations:
             image = self._item_image(item, preferred='image_square')
             name, code = item['name'], item.get('code', '')
@@ -719,17 +2143,68 @@ class TvpPlugin(Plugin):
                 else:
                     kdir.play(title, call(self.station, ch.code, '.pvr'), image=image, **kwargs)
 
+    def epg_index(self, start, end=None, *, stations=None):
+        """Returns EpgIndex of all stations for `start`..`end` time range."""
+        if stations is None:
+            stations = self.stations()
+        codes = [item['code'] for item in stations if item.get('code')]
+        return EpgIndex(self.site.stations_epg_range(codes, start, end))
+
+    @entry(path='/tv/at', title=L(30186, "What's on at…"))
+    def tv_at(self, when=None):
+        """What's on every station at `when` (YYYYmmddHHMM), ask for day and time if missing."""
+        now = datetime.now()
+        if when is None:
+            today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            days = [today + timedelta(days=n) for n in range(-self.TV_AT_DAYS_BACK, 2)]
+            index = xbmcgui.Dialog().select(L(30186, "What's on at…"), [day_label(day, now=now) for day in days],
+                                            preselect=self.TV_AT_DAYS_BACK)
+            if index < 0:
+                return
+            # type = 2  - ShowAndGetTime
+            hm = xbmcgui.Dialog().numeric(2, L(30186, "What's on at…"), f'{now:%H:%M}')
+            try:
+                hour, minute = (int(v) for v in hm.split(':'))
+            except ValueError:  # cancelled
+                return
+            when = days[index].replace(hour=hour, minute=minute)
+        elif not isinstance(when, datetime):
+            when = datetime.strptime(str(when), '%Y%m%d%H%M')
+        title_format = TvEntryFormat.get(self.settings.tv_entry_format, self.settings.tv_entry_custom_format)
+        stations = self.stations()
+        programs = self.epg_index(when, stations=stations).at(when)
+        with self.directory() as kdir:
+            for ch in self.channel_iter_stations():
+                prog = programs.get(ch.code)
+                if not prog:
+                    continue
+                title, label2 = self.fmt(title_format, prog=prog, channel=ch, tv=ch.name, title=prog.title,
+                                         times=prog.times, start=prog.start, end=prog.end, date=prog.date)
+                info = {
+                    'plotoutline': f'[B]{prog.title}[/B][CR]{prog.outline}',
+                    'plot': prog.descr,
+                }
+                eprog = prog.get('program') or {}
+                image = self._item_image(eprog, eprog.get('cycle'), default=ch.image)
+                if prog.start <= now < prog.end:
+                    kdir.play(title, call(self.station, ch.code, '.pvr'), image=image, info=info, label2=label2)
+                elif prog.start < now:
+                    kdir.play(title, call(self.play_program, code=ch.code, prog=prog['record_id']), image=image,
+                              info=info, label2=label2)
+                else:
+                    kdir.item(f'[I]{title}[/I]', self.no_operation, image=image, info=info, label2=label2)
+
     @entry(title=L(30106, 'TV (HBB)'))
     def tv_hbb(self):
         """TV channel list."""
         with self.directory() as kdir:
-            for ch in self.channel_iter():
+            for ch in self.channel_iter_hbb():
                 title = f'{ch.name} [COLOR gray][{ch.code or ""}][/COLOR]'
                 if ch.code:
-                    kdir.play(title, call(self.station, ch.code, '.pvr'), image=ch.img)
+                    kdir.play(title, call(self.station, ch.code, '.pvr'), image=ch.image)
                 else:
                     title += f' [COLOR gray]{ch.id}[/COLOR]'
-                    kdir.play(title, call(self.video, ch.id), image=ch.img)
+                    kdir.play(title, call(self.video, ch.id), image=ch.image)
 
     @entry(title=L(30107, 'TV (tv-stations)'))
     def tv_stations(self):
@@ -757,34 +2232,28 @@ class TvpPlugin(Plugin):
                 img = item['logo_src']
                 kdir.play(f'{name} [COLOR gray][{code}][/COLOR]{extra}', call(self.station, code), image=img)
 
-    @entry(title=L(30109, 'TV (drzewo)'))
-    def tv_tree(self):
-        # recurse scan tree
-        live, to_get = [], [68970]
-        # filter_data = json.dumps({"playable": True})
-        while to_get:
-            # log(f'tv_tree({to_get})...')
-            with self.site.concurrent() as con:
-                for pid in to_get:
-                    # con.jget(None, params={'direct': True, 'count': '', 'parent_id': pid, 'filter': filter_data})
-                    con.listing(pid, count=UNLIMITED)
-            to_get = []
-            for data in con:
-                for item in data.get('items') or ():
-                    if item['object_type'] in ('video', 'epg_item'):
-                        if item.get('playable'):
-                            live.append(item)
-                    elif 'asset_id' in item:
-                        to_get.append(item['asset_id'])
+    def tv_tree_crawl(self, *, progress=None):
+        """Crawl the TV tree and return channel map `{title: [items]}`. Could be cancelled by `progress` dialog."""
+        def leaf(item):
+            return item.get('object_type') in ('video', 'epg_item')
+
+        started = time.monotonic()
+        live = []
+        for item in self.site.crawl(self.TV_TREE_ROOT, leaf=leaf, max_depth=self.TV_TREE_DEPTH,
+                                    max_fanout=self.TV_TREE_FANOUT, max_nodes=self.TV_TREE_NODES,
+                                    timeout=self.TV_TREE_TIMEOUT):
+            if item.get('playable'):
+                live.append(item)
+            if progress is not None:
+                percent = int(100 * (time.monotonic() - started) / self.TV_TREE_TIMEOUT)
+                progress.update(min(percent, 100), f'{len(live)}')
+                if progress.iscanceled():
+                    break
         # combine the same channels
         retitle = re.compile(r'^(?:\d+\s*)?(?:(TVP)\s*3\b)?(.*?)(?:\s+hd)?(?:\s*\(?(?:hbbtv|hbb)\)?)?\s*$',
                              re.IGNORECASE)
         tv, to_get = {}, []
         for item in live:
-            # log(safefmt(('TV(tree): id={asset_id!r}, vid={video_id!r}, live={live_video_id!r}, playable={playable!r},'
-            #             ' video_format={video_format_len}, videoFormatMimes={videoFormatMimes_len}, title={title!r}'),
-            #             video_format_len=len(item.get('video_format', [])),
-            #             videoFormatMimes_len=len(item.get('videoFormatMimes', [])), **item))
             title = retitle.sub(r'\1\2', item['title'].replace('Wlkp.', 'Wielkopolski'))
             if 'live_video_id' in item:
                 to_get.append(item['asset_id'])
@@ -797,21 +2266,83 @@ class TvpPlugin(Plugin):
         for items in tv.values():
             for item in items:
                 if 'live_video_id' in item:
-                    item.setdefault('videoFormatMimes', []).extend(videos.get('videoFormatMimes', []))
+                    video = videos.get(item['asset_id']) or {}
+                    item.setdefault('videoFormatMimes', []).extend(video.get('videoFormatMimes', []))
         # filter out if no 'video_format'
         tv = {title: [item for item in items if item.get('videoFormatMimes')] for title, items in tv.items()}
-        tv = {title: items for title, items in tv.items() if items}
+        return {title: items for title, items in tv.items() if items}
+
+    @entry(title=L(30109, 'TV (drzewo)'))
+    def tv_tree(self):
+        # Channel map is persisted, crawled on the first time and refreshed when stale, both with progress
+        # (the crawl takes up to TV_TREE_TIMEOUT, too long for a background thread, see `background_wait()`).
+        # Cancelled refresh keeps the old map.
+        cache = self.cache('tv_tree')
+        tv = cache.get('tv', ttl=self.TV_TREE_TTL)
+        if tv is None or cache.expired('tv', ttl=self.TV_TREE_REFRESH):
+            progress = xbmcgui.DialogProgress()
+            progress.create(L(30109, 'TV (drzewo)'))
+            try:
+                crawled = self.tv_tree_crawl(progress=progress)
+                if not progress.iscanceled():
+                    tv = cache.set('tv', crawled)
+                elif tv is None:
+                    tv = crawled
+            finally:
+                progress.close()
         # build kodi directory list
         with self.directory(isort='label') as kdir:
             for title, items in tv.items():
                 title += f" : [COLOR yellow]{','.join(str(it['asset_id']) for it in items)}[/COLOR]"
                 self._item(kdir, items[0], title=title)
-                log(title)
+
+    @entry(path='/traces', title=L(30195, 'Request traces'))
+    def traces(self):
+        """List of saved request traces (debugging), the newest first."""
+        with self.directory() as kdir:
+            for path in sorted((self.profile_path / 'traces').glob('*.jsonl'), reverse=True):
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        summary = json.loads(f.readline())
+                except (OSError, ValueError):
+                    continue
+                title = (f'{summary["time"]:6.2f} s  [{summary["requests"]}]  '
+                         f'{summary["bytes"] / 1024:.0f} kB  {summary["route"]}')
+                kdir.menu(title, call(self.trace_view, path.stem), label2=summary['started'])
+
+    @entry(path='/latency', title=L(30196, 'Latency'))
+    def latency(self):
+        """Dashboard: the slowest routes and endpoints (p50 / p95 / p99 in ms)."""
+        hists = LatencyHistograms(self.profile_path / 'latency.json').load()
+        with self.directory() as kdir:
+            for kind, title in (('route', L(30197, 'Routes')), ('endpoint', L(30198, 'Endpoints'))):
+                kdir.separator(title)
+                for name, p50, p95, p99, count in hists.slowest(kind):
+                    kdir.item(f'{p50:6.0f} / {p95:6.0f} / {p99:6.0f} ms  {name}', self.no_operation,
+                              label2=f'{count}')
+
+    @entry(path='/traces/<name>')
+    def trace_view(self, name):
+        """Records of the request trace: requests, cache lookups and profile."""
+        with self.directory() as kdir:
+            for rec in RequestTrace.load(self.profile_path / 'traces' / f'{name}.jsonl')[1:]:
+                if rec['type'] == 'http':
+                    status = rec.get('status', f'[COLOR red]{rec.get("error")}[/COLOR]')
+                    title = (f'{rec["time"] * 1000:5.0f} ms  {rec.get("bytes", 0) / 1024:6.1f} kB  '
+                             f'{status}  {rec["endpoint"]}')
+                    plot = f'{rec["method"]} {rec["endpoint"]}[CR]{rec.get("params")}[CR]{rec.get("cache")}'
+                elif rec['type'] == 'cache':
+                    title = f'[COLOR gray]cache {rec["status"]}  {rec["name"]}  {rec["key"]}[/COLOR]'
+                    plot = None
+                else:
+                    title = f'[COLOR gold]{rec["cumtime"]:7.3f} s  {rec["calls"]}×  {rec["func"]}[/COLOR]'
+                    plot = f'tottime: {rec["tottime"]} s'
+                kdir.item(title, self.no_operation, info={'plot': plot}, label2=f'{rec.get("at", "")}')
 
     @entry(path='/replay', title=L(30115, 'Archive'))
     def replay_list(self):
         with self.directory() as kdir:
-            for item in self.site.stations():
+            for item in self.stations():
                 image = self._item_image(item, preferred='image_square')
                 name, code = item['name'], item.get('code', '')
                 kdir.menu(name, call(self.replay_channel, code), image=image,
@@ -830,11 +2361,46 @@ class TvpPlugin(Plugin):
                 menu.append((L(30123, 'Live TV'), self.cmd.PlayMedia(call(self.station, code))))
                 kdir.menu(label, call(self.replay_date, code=code, date=f'{date:%Y%m%d}'), menu=menu)
 
+    def station_fast_epg(self, code, date):
+        """
+        EPG from `station_epg` only, merged with already cached occurrence details.
+
+        Missing occurrences are fetched in background thread and cached for the next time.
+        """
+        cache = self.cache('occurrence')
+        epg, missing = [], []
+        for item in self.site.station_epg(code, date):
+            occ = cache.get(item['id'], ttl=self.OCCURRENCE_TTL) if item.get('id') else None
+            if occ:
+                epg.append({**occ, **{k: item[k] for k in ('date_start', 'date_end', 'record_id') if k in item}})
+            else:
+                epg.append(item)
+                if item.get('id'):
+                    missing.append(item['id'])
+
+        def fetch():
+            with self.site.concurrent() as con:
+                for oid in missing:
+                    con[oid].occurrence(oid)
+            for oid in missing:
+                data = (con[oid] or {}).get('data')
+                if data:
+                    cache.set(oid, data, save=False)
+            cache.purge(ttl=self.OCCURRENCE_TTL)
+
+        if missing:
+            self.background(fetch, name='occurrence')
+        return ChannelEpg(epg)
+
     @entry(path='/replay/<code>/<date>')
     def replay_date(self, code, date, *, future=False):
         now_msec = int(datetime.now().timestamp() * 1000)  # TODO handle timezone
+        if self.settings.replay_fast:
+            epg = self.station_fast_epg(code, date)
+        else:
+            epg = self.site.station_full_epg(code, date)
         with self.directory() as kdir:
-            for prog in self.site.station_full_epg(code, date):
+            for prog in epg:
                 archive = prog['date_start'] < now_msec
                 if archive or future:
                     pid = prog['record_id']
@@ -856,17 +2422,21 @@ class TvpPlugin(Plugin):
     @entry(path='/iptv_catchup/<code>/<target_date>')
     def _iptv_catchup_helper(self, code, target_date):
         log(f' TARGET _ DATE : {target_date}')
-        date_obj = datetime.strptime(target_date, '%Y-%m-%dT%H:%M:%S') + timedelta(minutes=5)
-        timestamp = int((datetime.timestamp(date_obj) * 1000))
-        epg = self.site.station_epg(code, target_date)
-
-        for e in epg:
-            if timestamp == e['date_start']:
-                pid = e.get('record_id')
-                streams, mimetype = self.site.station_streams(station_code=code, record_id=pid)
-                if streams:
-                    stream = self.get_stream_of_type(streams, mimetype=mimetype, catchup=True)
-                    self._play(stream)
+        date_obj = datetime.strptime(target_date, '%Y-%m-%dT%H:%M:%S')
+        pid = self.catchup_index.find(code, date_obj)
+        if pid is None:
+            # not in the index yet, `station_epg()` fills the index
+            self.site.station_epg_range(code, date_obj - timedelta(minutes=30), date_obj + timedelta(minutes=30))
+            pid = self.catchup_index.find(code, date_obj)
+        if pid is None:
+            log.warning(f'No catch-up program on {code!r} at {date_obj}', title='TVP')
+            return self.play_failed()
+        streams, mimetype = self.site.station_streams(station_code=code, record_id=pid)
+        if streams:
+            stream = self.get_stream_of_type(streams, mimetype=mimetype, catchup=True)
+            self._play(stream)
+        else:
+            self.play_failed()
 
     def _epg_item(self, kdir, item, *, code=None, now=None):
         if now is None:
@@ -907,19 +2477,15 @@ class TvpPlugin(Plugin):
             self._play(stream)
 
     def station(self, code: PathArg, pvr=''):
-        date = datetime.today()
-        program = self.site.jget('https://tvpstream.tvp.pl/api/tvp-stream/program-tv/index',
-                                 params={'station_code': code, 'date': date}).get('data')
-        if program:
-            timestamp = int(datetime.now().timestamp())
-            # jeśli brakuje epg dla programu -- ustawia "domyślne" wartości dla p_begin i p_end = -30min / +180min
-            p_begin = (datetime.now() - timedelta(minutes=30)).timestamp()
-            p_end = (datetime.now() + timedelta(minutes=180)).timestamp()
-            # w innym wypadku bierze dane z epg
-            for p in program:
-                if p['date_start'] / 1000 <= timestamp <= p['date_end'] / 1000:
-                    p_begin = p['date_start'] / 1000
-                    p_end = p['date_end'] / 1000
+        now = datetime.now()
+        # jeśli brakuje epg dla programu -- ustawia "domyślne" wartości dla p_begin i p_end = -30min / +180min
+        p_begin = (now - timedelta(minutes=30)).timestamp()
+        p_end = (now + timedelta(minutes=180)).timestamp()
+        # w innym wypadku bierze dane z epg
+        prog = self.site.station_epg_range(code, now).current
+        if prog:
+            p_begin = prog['date_start'] / 1000
+            p_end = prog['date_end'] / 1000
 
         data = self.site.jget('https://tvpstream.tvp.pl/api/tvp-stream/stream/data',
                               params={'station_code': code}).get('data')
@@ -969,7 +2535,7 @@ class TvpPlugin(Plugin):
                     play_item.setProperty('inputstream.adaptive.stream_headers',
                                           'Referer: https://vod.tvp.pl/&User-Agent=' + quote(UA))
                     if is_live:
-                        if KODI_VERSION >= 20:
+                        if kodi_version() >= 20:
                             video_info.setResumePoint(float(resume_time), float(total_time))
                         else:
                             play_item.setProperty('ResumeTime', resume_time)
@@ -1004,39 +2570,48 @@ class TvpPlugin(Plugin):
         end = datetime.fromtimestamp(end) - self.tz_offset
         return end
 
+    def transmission_days(self, id):
+        """
+        Current and future transmissions of virtual channel `id` grouped by local day.
+
+        Transmission list is fetched once (short TTL) and all day folders are served from it.
+        Returns `{date: [(local_start, item)]}` in time order.
+        """
+        def fetch():
+            return list(self.site.transmissions_items(id, filter_dict=CurrentAndFuture))
+
+        now = datetime.utcnow()
+        days = {}
+        for item in self.cached('transmissions', id, fetch, ttl=self.TRANSMISSIONS_TTL):
+            # Only current and future
+            end = self._item_end_time(item)
+            if end and item.get('is_live') and end + self.site.dT >= now:
+                local_start = self._item_start_time(item) + self.tz_offset
+                days.setdefault(local_start.date(), []).append((local_start, item))
+        return days
+
     def transmissions(self, id: PathArg, date=None):
         """Live transmission (sport: 13010508, parlament: 4422078)."""
-        now = datetime.utcnow()
-        local_now = now + self.tz_offset
-        local_prev = datetime.fromtimestamp(86400)
+        local_now = datetime.utcnow() + self.tz_offset
         layout = self.settings.transmission_layout
-        if date:
-            date = str2date(date)
+        days = self.transmission_days(id)
         with self.directory() as kdir:
-            # Reverse reversed order - get from current to future.
-            for item in self.site.transmissions_items(id, filter_dict=CurrentAndFuture):
-                # Only current and future
-                end = self._item_end_time(item)
-                if end:
-                    # log(f'now={now}, @now={local_now}, end={end} ({end + self.tz_offset}), live={item.get(
-                    # "is_live")}', title='===TIME===')
-                    if item.get('is_live') and end + self.site.dT >= now:
-                        start = self._item_start_time(item)
-                        local_start = start + self.tz_offset
-                        # log(f'now={now}, @now={local_now}, start={start} ({local_start}, end={end}', title='TIME')
-                        if date is None or local_start.date() == date:
-                            if date is not None or layout == TransmissionLayout.SingleList:
-                                self._item(kdir, item)
-                            elif layout == TransmissionLayout.DayFolder:
-                                if local_start.date() != local_prev.date():
-                                    title = day_label(local_start, now=local_now)
-                                    kdir.menu(title, call(self.transmissions, id, date=local_start.date()))
-                            elif layout == TransmissionLayout.DayLabel:
-                                if local_start.date() != local_prev.date():
-                                    title = day_label(local_start, now=local_now)
-                                    kdir.separator(title, folder=call(self.transmissions, id, date=local_start.date()))
-                                self._item(kdir, item, single_day=True)
-                            local_prev = local_start
+            if date:
+                for local_start, item in days.get(str2date(date), ()):
+                    self._item(kdir, item)
+                return
+            for day, items in days.items():
+                if layout == TransmissionLayout.SingleList:
+                    for local_start, item in items:
+                        self._item(kdir, item)
+                elif layout == TransmissionLayout.DayFolder:
+                    title = day_label(items[0][0], now=local_now)
+                    kdir.menu(title, call(self.transmissions, id, date=day))
+                elif layout == TransmissionLayout.DayLabel:
+                    title = day_label(items[0][0], now=local_now)
+                    kdir.separator(title, folder=call(self.transmissions, id, date=day))
+                    for local_start, item in items:
+                        self._item(kdir, item, single_day=True)
 
     @staticmethod
     def _item_image(*items, preferred=None, default=None):
@@ -1237,8 +2812,7 @@ class TvpPlugin(Plugin):
         """Play video – PlayTVPInfo by mtr81."""
         # TODO: cleanup
         if vod:
-            data = self.site.jget(f'https://vod.tvp.pl/api/products/{id}/videos/playlist'
-                                  '?platform=BROWSER&videoType=MOVIE')
+            data = self.site.vod_playlist(id).data
         else:
             data = self.site.details(id)
         log(f"Video: {id}, type={data.get('type')}, live_video_id={data.get('live_video_id')},"
@@ -1334,7 +2908,7 @@ class TvpPlugin(Plugin):
                     for d in resp['data']:
                         if 'id' in d:
                             if d['id'] == id:
-                                if Ttml2SsaAddon is not None:
+                                if ttml2ssa() is not None:
                                     subt = self.subt_gen_abo(d)
                                 if d['is_drm'] is True:  # DRM
                                     url_stream = re.findall('fileDash\': \'([^\']+?)\'', str(resp))[0]
@@ -1348,7 +2922,7 @@ class TvpPlugin(Plugin):
                                         is_helper = inputstreamhelper.Helper(protocol, drm=drm)
                                         if is_helper.check_inputstream():
                                             play_item = xbmcgui.ListItem(path=url_stream)
-                                            if Ttml2SsaAddon is not None:
+                                            if ttml2ssa() is not None:
                                                 play_item.setSubtitles(subt)
                                             play_item.setProperty("inputstream", is_helper.inputstream_addon)
                                             play_item.setProperty("inputstream.adaptive.manifest_type", protocol)
@@ -1366,7 +2940,7 @@ class TvpPlugin(Plugin):
                                     if 'material_niedostepny' not in stream['url']:
                                         play_item = xbmcgui.ListItem(path=stream['url'])
                                         play_item.setProperty('IsPlayable', 'true')
-                                        if Ttml2SsaAddon is not None:
+                                        if ttml2ssa() is not None:
                                             play_item.setSubtitles(subt)
                                         xbmcplugin.setResolvedUrl(self.handle, True, listitem=play_item)
                                     else:
@@ -1414,7 +2988,7 @@ class TvpPlugin(Plugin):
                 for n, it in enumerate(d['subtitles']):
                     url_subt = it['src']
                     resp = self.site.get(url_subt)
-                    ttml = Ttml2SsaAddon()
+                    ttml = ttml2ssa()()
                     ttml.parse_ttml_from_string(resp.text)
                     ttml.write2file(path / f'subt_{n + 1:02d}.ssa')
                     subt.append(path / f'subt_{n + 1:02d}.ssa')
@@ -1422,7 +2996,7 @@ class TvpPlugin(Plugin):
 
     def subt_gen_free(self, aId):
         """Tablica z linkami do plików z napisami (format .ssa)."""
-        if Ttml2SsaAddon is None:  # XXX DEBUG only
+        if ttml2ssa() is None:  # XXX DEBUG only
             return []
         url = URL('https://vod.tvp.pl/sess/TVPlayer2/api.php?id={aId}&@method=getTvpConfig&@callback=?')
         resp = self.site.get(url).text
@@ -1441,7 +3015,7 @@ class TvpPlugin(Plugin):
         if 'subtitles' in data and len(data['subtitles']):
             for n, d in enumerate(data['subtitles']):
                 url_subt = url.join(d['url'])
-                ttml = Ttml2SsaAddon()
+                ttml = ttml2ssa()()
                 ttml.parse_ttml_from_string(self.site.get(url_subt).text)
                 ttml.write2file(path / f'subt_{n + 1:02d}.ssa')
                 subt.append(path / f'subt_{n + 1:02d}.ssa')
@@ -1452,41 +3026,33 @@ class TvpPlugin(Plugin):
 
     def hbb_api(self, query):
         """Request query and returns JSON."""
-        query = {
-            "operationName": None,
-            "variables": {
-                "categoryId": None,
-            },
-            # "extensions": {
-            #     "persistedQuery": {
-            #         "version": 1,
-            #         "sha256Hash": "5c29325c442c94a4004432d70f94e336b8c258801fe16946875a873e818c8aca",
-            #     },
-            # },
-            "query": query,
-        }
-        return self.site.jpost('https://hbb-prod.tvp.pl/apps/manager/api/hub/graphql', json=query)
+        return self.site.hbb_api(query, variables={'categoryId': None})
+
+    HBB_STATIONS_QUERY = '''
+        query {
+            getStationsForMainpage {
+                items {
+                    id
+                    name
+                    code
+                    image_square {
+                        url
+                        width
+                        height
+                    }
+                }
+            }
+        }'''
 
     def channel_iter_hbb(self):
         """JSON-live channel list."""
-        data = self.hbb_api('''
-            query {
-                getStationsForMainpage {
-                    items {
-                        id
-                        name
-                        code
-                        image_square {
-                            url
-                            width
-                            height
-                        }
-                    }
-                }
-            }''')
-        log(f'data\n{data!r}')
+        def fetch():
+            return self.hbb_api(self.HBB_STATIONS_QUERY)['data']['getStationsForMainpage']['items']
+
+        items = self.cached('hbb', 'stations', fetch, ttl=self.STATIONS_TTL, refresh=self.STATIONS_REFRESH)
+        log(f'HBB stations: {len(items)}', title='TVP')
         re_name = re.compile(r'^(?:EPG(?:\s*-\s*)?)?\s*([^\d]+?)\s*(\d.*)?\s*$')
-        for ch in data['data']['getStationsForMainpage']['items']:
+        for ch in items:
             code = ch['code']
             name = ' '.join(s for s in re_name.search(ch['name']).groups() if s)
             imgdata = ch['image_square']
@@ -1502,8 +3068,8 @@ class TvpPlugin(Plugin):
             img = imgdata['url'].format(width=width, height=height)
             yield ChannelInfo(code=code, name=name, image=img, id=ch_id)
 
-    @search.folder
-    def search_bestresults(self, query):
+    def go_search(self, query):
+        """TVP GO search, returns `[(found, details)]`, details are fetched concurrently."""
         def details(con, item):
             itype = item.get('type')
             if itype == 'OCCURRENCE':
@@ -1511,102 +3077,243 @@ class TvpPlugin(Plugin):
             else:
                 return con.details(item['id'])
 
-        now = datetime.now()
         url = (f'https://sport.tvp.pl/api/tvp-stream/search?query={query}'
                '&scope=bestresults&page=1&limit=&device=android')
+        items = [item for item in self.site.jget(url).get('data', {}).get('occurrenceitem', ()) if 'id' in item]
+        with self.site.concurrent() as con:
+            indexes = [details(con, item) for item in items]
+        return [(found, con[index]) for index, found in zip(indexes, items)]
+
+    def _go_item(self, kdir, found, item, *, now=None):
+        """Add TVP GO search result (`found` with its `item` details)."""
+        if found.get('type') == 'OCCURRENCE':
+            self._epg_item(kdir, item['data'], now=now)
+        else:
+            item['FOUND'] = found
+            cycle = found.get('program', {}).get('cycle', {})
+            if cycle and cycle.get('title'):
+                item['SERIES'] = {
+                    'id': item['parents'][0],
+                    'title': cycle['title'],
+                    'image_logo': cycle.get('image_logo'),
+                }
+            self._item(kdir, item)
+
+    @search.folder
+    def search_bestresults(self, query):
+        now = datetime.now()
+        with self.directory() as kdir:
+            for found, item in self.go_search(query):
+                self._go_item(kdir, found, item, now=now)
+
+    def all_search_folder(self, query):
+        """Federated search: TVP GO and all TVP VOD types at once, limited by ALL_SEARCH_TIMEOUT."""
+        from concurrent.futures import ThreadPoolExecutor, wait
+        now = datetime.now()
+        backends = {s_type: partial(self.vod_search_results, query, [s_type]) for s_type, _ in self.VOD_SEARCH_TYPES}
+        backends['go'] = partial(self.go_search, query)
+        executor = ThreadPoolExecutor(max_workers=len(backends))
+        futures = {executor.submit(fn): name for name, fn in backends.items()}
+        done, pending = wait(futures, timeout=self.ALL_SEARCH_TIMEOUT)
+        # Show partial results now. Running requests of slow backends can not be interrupted,
+        # the interpreter still waits for them at exit (the directory is already sent then).
+        for fut in pending:
+            fut.cancel()  # not started yet (`shutdown(cancel_futures=True)` needs Python 3.9, Kodi 19 has 3.8)
+        executor.shutdown(wait=False)
+        if pending:
+            log.warning(f'Search {query!r}: no answer from {sorted(futures[fut] for fut in pending)}', title='TVP')
+        results = {}
+        for fut in done:
+            try:
+                results[futures[fut]] = fut.result()
+            except Exception as exc:
+                log.warning(f'Search {query!r} in {futures[fut]} failed: {exc}', title='TVP')
+
+        seen = set()
+
+        def unique(backend, kind, iid, title):
+            # the same id, or the same title of the same backend and type (e.g. episode and its occurrence)
+            keys = {(backend, iid)}
+            if title:
+                keys.add((backend, kind, title.casefold()))
+            if keys & seen:
+                return False
+            seen.update(keys)
+            return True
+
+        with self.directory() as kdir:
+            for s_type, label in self.VOD_SEARCH_TYPES:
+                data = results.get(s_type, {}).get(s_type) or {}
+                for item in data.get('items') or ():
+                    if unique('vod', s_type, item['id'], item['title']):
+                        self._vod_search_item(kdir, item, s_type, label2=label)
+            for found, item in results.get('go', ()):
+                data = (item.get('data') or {}) if found.get('type') == 'OCCURRENCE' else item
+                title = data.get('title')
+                if unique('go', found.get('type'), found['id'], title):
+                    self._go_item(kdir, found, item, now=now)
+
+    def epg_search_update(self, *, progress=None, timeout=None, fresh=False):
+        """
+        Fetch EPG of all stations ± EPG_SEARCH_DAYS and index it (station by station).
+
+        Resumable: every indexed station is marked in 'epg_search' cache, stations updated within EPG_SEARCH_REFRESH
+        are skipped (unless `fresh`), so next call continues after `timeout` or cancel.
+        Returns True if all stations are indexed.
+        """
+        cache = self.cache('epg_search')
+        deadline = None if timeout is None else time.monotonic() + timeout
+        now = datetime.now()
+        days = timedelta(days=self.EPG_SEARCH_DAYS)
+        codes = [item['code'] for item in self.stations() if item.get('code')]
+        for n, code in enumerate(codes):
+            if not fresh and not cache.expired(f'station:{code}', ttl=self.EPG_SEARCH_REFRESH):
+                continue
+            if progress is not None:
+                if progress.iscanceled():
+                    return False
+                progress.update(100 * n // len(codes), code)
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            self.epg_search_index.update(code, self.site.station_epg_range(code, now - days, now + days))
+            cache.set(f'station:{code}', True)
+        cache.set('updated', True)
+        return True
+
+    def epg_search_folder(self, query):
+        """Search programs in local EPG index (no network access)."""
+        cache = self.cache('epg_search')
+        if not self.epg_search_index.codes():
+            # the first search, build the index now
+            progress = xbmcgui.DialogProgress()
+            progress.create(L(30199, 'Building EPG search index…'))
+            try:
+                self.epg_search_update(progress=progress, fresh=True)
+            finally:
+                progress.close()
+        elif cache.expired('updated', ttl=self.EPG_SEARCH_REFRESH):
+            # stale index is updated in background by short steps (resumed station by station)
+            self.background(partial(self.epg_search_update, timeout=self.EPG_SEARCH_STEP), name='epg-search')
+        now = datetime.now()
         with self.directory() as kdir:
-            items = self.site.jget(url).get('data', {}).get('occurrenceitem', ())
+            for rec in self.epg_search_index.search(query):
+                self._epg_item(kdir, rec, now=now)
+
+    def vod_search_results(self, query, types=None):
+        """Returns VoD search results `{s_type: data}`, cached per (query, type). Missing are fetched concurrently."""
+        if types is None:
+            types = [s_type for s_type, _ in self.VOD_SEARCH_TYPES]
+        cache = self.cache('vod_search')
+        results = {s_type: cache.get(f'{s_type}:{query}', ttl=self.VOD_SEARCH_TTL) for s_type in types}
+        missing = [s_type for s_type, data in results.items() if data is None]
+        if missing:
             with self.site.concurrent() as con:
-                indexes = [details(con, item) for item in items if 'id' in item]
-            # items = [{**con[i], **{'FOUND': found}} for i, found in zip(indexes, items)]
-            for index, found in zip(indexes, items):
-                itype = found.get('type')
-                if itype == 'OCCURRENCE':
-                    self._epg_item(kdir, con[index]['data'], now=now)
-                else:
-                    item = con[index]
-                    item['FOUND'] = found
-                    cycle = found.get('program', {}).get('cycle', {})
-                    if cycle and cycle.get('title'):
-                        item['SERIES'] = {
-                            'id': item['parents'][0],
-                            'title': cycle['title'],
-                            'image_logo': cycle.get('image_logo'),
-                        }
-                    self._item(kdir, item)
+                for s_type in missing:
+                    con[s_type].vod_search_data(query, s_type)
+            for s_type in missing:
+                results[s_type] = cache.set(f'{s_type}:{query}', con[s_type] or {}, save=False)
+            cache.purge(ttl=self.VOD_SEARCH_TTL)
+        return results
 
     def vod_search_folder(self, query):
+        # all types are searched at once, empty categories are hidden
+        results = self.vod_search_results(query)
         with self.directory() as kdir:
-            kdir.menu('Filmy', call(self.vod_search_data, query, 'movie'))
-            kdir.menu('Seriale', call(self.vod_search_data, query, 'serial'))
-            kdir.menu('Odcinki', call(self.vod_search_data, query, 'episode'))
+            for s_type, title in self.VOD_SEARCH_TYPES:
+                count = len(results[s_type].get('items') or ())
+                if count:
+                    kdir.menu(f'{title} ({count})', call(self.vod_search_data, query, s_type))
 
     def vod_search_data(self, query, s_type):
+        data = self.vod_search_results(query, [s_type])[s_type]
         with self.directory() as kdir:
-            if s_type == 'movie':
-                data = self.site.vod_search_data(query, 'movie')
-                for item in data['items']:
-                    info = {
-                        'title': item['title'],
-                        'plot': item.get('lead')
-                    }
-                    art = {'fanart': image_source(item, '16x9')[0], 'poster': image_source(item, '3x4')[0]}
-                    kdir.menu(item['title'], call(self.vod_results, item['id']), descr=item.get('lead'), info=info, art=art)
-            if s_type == 'serial':
-                data = self.site.vod_search_data(query, 'serial')
-                for item in data['items']:
-                    info = {
-                        'title': item['title'],
-                        'plot': item.get('lead')
-                    }
-                    art = {'fanart': image_source(item, '16x9')[0], 'poster': image_source(item, '3x4')[0]}
-                    kdir.menu(item['title'], call(self.vod_serial_results, item['id']), descr=item.get('lead'), info=info, art=art)
-            if s_type == 'episode':
-                data = self.site.vod_search_data(query, 'episode')
-                for item in data['items']:
-                    info = {
-                        'title': item['title'],
-                        'plot': item.get('lead')
-                    }
-                    art = {'fanart': image_source(item, '16x9')[0], 'poster': image_source(item, '3x4')[0]}
-                    kdir.menu(item['title'], call(self.vod_results, item['id']), descr=item.get('lead'), info=info, art=art)
+            for item in data.get('items') or ():
+                self._vod_search_item(kdir, item, s_type)
+
+    def _vod_search_item(self, kdir, item, s_type, **kwargs):
+        """Add VoD search result `item` of `s_type`."""
+        target = self.vod_serial_results if s_type == 'serial' else self.vod_results
+        info = {
+            'title': item['title'],
+            'plot': item.get('lead')
+        }
+        art = {'fanart': image_source(item, '16x9')[0], 'poster': image_source(item, '3x4')[0]}
+        kdir.menu(item['title'], call(target, item['id']), descr=item.get('lead'), info=info, art=art, **kwargs)
 
     def vod_results(self, id: PathArg[int]):
+        product = self.site.vod_product(id)
+        if product.id and not product.paid:
+            # speculative, "play" uses it while the playlist is valid
+            self.background(self.site.vod_playlist, product.id)
         with self.directory() as kdir:
-            page = self.site.jget(f'https://vod.tvp.pl/api/products/vods/{id}', params={
-                'lang': 'pl',
-                'platform': 'BROWSER'
-            })
+            page = product.data
             art = {'fanart': image_source(page, '16x9')[0], 'poster': image_source(page, '3x4')[0]}
-            if page.get('paymentSchedules'):
-                kdir.play(page['title'] + ' [PŁATNE]', call(self.video, page['id'], vod=True, paid=True),
-                          descr=page.get('lead'), art=art)
+            if product.paid:
+                kdir.play(product.title + ' [PŁATNE]', call(self.video, product.id, vod=True, paid=True),
+                          descr=product.lead, art=art)
             else:
                 info = {
-                    'title': page['title'],
-                    'plot': page.get('lead')
+                    'title': product.title,
+                    'plot': product.lead
                 }
-                kdir.play(page['title'], call(self.video, page['id'], vod=True), info=info, descr=page.get('lead'), art=art)
-            if page.get('trailer'):
-                kdir.play(page['title'] + ' [Zwiastun]', call(self.trailer, page['id']), descr=page.get('lead'))
+                kdir.play(product.title, call(self.video, product.id, vod=True), info=info, descr=product.lead,
+                          art=art)
+            if product.trailer:
+                kdir.play(product.title + ' [Zwiastun]', call(self.trailer, product.id), descr=product.lead)
+
+    def vod_seasons(self, id):
+        """Cached VoD serial seasons."""
+        return self.cached('vod_seasons', id, partial(self.site.vod_seasons, id), ttl=self.VOD_TTL)
+
+    def vod_episodes(self, id, s_id):
+        """Cached VoD serial season episodes."""
+        return self.cached('vod_episodes', f'{id}:{s_id}', partial(self.site.vod_episodes, id, s_id), ttl=self.VOD_TTL)
+
+    def vod_prefetch_episodes(self, id, seasons):
+        """Fetch episodes of all `seasons` of serial `id` concurrently."""
+        cache = self.cache('vod_episodes')
+        missing = [item['id'] for item in seasons if cache.expired(f'{id}:{item["id"]}', ttl=self.VOD_TTL)]
+        if missing:
+            with self.site.concurrent() as con:
+                for s_id in missing:
+                    con[s_id].vod_episodes(id, s_id)
+            for s_id in missing:
+                if con[s_id] is not None:
+                    cache.set(f'{id}:{s_id}', con[s_id], save=False)
+            cache.purge(ttl=self.VOD_TTL)
+
+    def background(self, target, *args, name=None):
+        """Run `target(*args)` in background (daemon) thread, log failure. See `background_wait()`."""
+        def run():
+            try:
+                target(*args)
+            except Exception as exc:
+                log.warning(f'Background {name or target.__name__} failed: {exc}', title='TVP')
+
+        thread = threading.Thread(target=run, name=name or target.__name__, daemon=True)
+        self._background.append(thread)
+        thread.start()
+        return thread
+
+    def background_wait(self, timeout):
+        """Wait up to `timeout` seconds (in total) for background threads, the rest is dropped on exit."""
+        deadline = time.monotonic() + timeout
+        for thread in self._background:
+            thread.join(max(0, deadline - time.monotonic()))
+        if any(thread.is_alive() for thread in self._background):
+            log.info(f'Background threads left: {[t.name for t in self._background if t.is_alive()]}', title='TVP')
 
     def vod_serial_results(self, id: PathArg[int]):
+        seasons = self.vod_seasons(id) or ()
+        # prefetch all seasons, they open instantly
+        self.background(self.vod_prefetch_episodes, id, seasons)
         with self.directory() as kdir:
-            page = self.site.jget(f'https://vod.tvp.pl/api/products/vods/serials/{id}/seasons', params={
-                'lang': 'pl',
-                'platform': 'BROWSER'
-            })
-            for item in page:
+            for item in seasons:
                 kdir.menu(item['title'], call(self.seasons, id, item['id']))
 
     def seasons(self, id: PathArg[int], s_id: PathArg[int]):
         with self.directory() as kdir:
-            page = self.site.jget(f'https://vod.tvp.pl/api/products/vods/serials/{id}/seasons/{s_id}/episodes',
-                                  params={
-                                      'lang': 'pl',
-                                      'platform': 'BROWSER'
-                                  })
-            for item in page:
+            for item in self.vod_episodes(id, s_id) or ():
                 info = {
                     'title': f"{item.get('season')['serial']['title']} {item['title']}",
                     'plot': item.get('lead')
@@ -1660,6 +3367,8 @@ class TvpPlugin(Plugin):
         return stream
 
     def iter_stream_of_type(self, streams, *, begin, end, mimetype, live, catchup):
+        import requests
+        from requests.models import PreparedRequest
         settings = Settings()
 
         for stream in streams:
@@ -1798,36 +3507,144 @@ class TvpPlugin(Plugin):
 
     # Generator m3u – do zaorania
     # TODO: make generator in the libka
-    def build_m3u(self):
+    def build_m3u(self, quiet=None, force=None):
+        """
+        Generate M3U playlist, entries are written as channels are produced.
+
+        Playlist is not regenerated if station list is not changed (see fingerprint),
+        use `force=1` to regenerate anyway. Use `quiet=1` to run unattended (no notifications),
+        e.g. `RunPlugin(plugin://plugin.video.kpl.tvp/build_m3u?quiet=1)` from a scheduler.
+        """
+        import hashlib
+        import xbmcvfs
+
+        quiet, force = str2bool(quiet), str2bool(force)
+
+        def notify(text, icon=xbmcgui.NOTIFICATION_INFO):
+            if not quiet or icon == xbmcgui.NOTIFICATION_ERROR:
+                xbmcgui.Dialog().notification('[B]TVP[/B]', text, icon)
+
         path_m3u = self.settings.m3u_folder
         file_name = self.settings.m3u_filename
 
         if not file_name or not path_m3u:
-            xbmcgui.Dialog().notification('[B]TVP[/B]', L(30132, 'Set filename and destination directory'),
-                                          xbmcgui.NOTIFICATION_ERROR)
+            notify(L(30132, 'Set filename and destination directory'), xbmcgui.NOTIFICATION_ERROR)
             return
 
-        xbmcgui.Dialog().notification('[B]TVP[/B]', L(30134, 'Generate playlist'), xbmcgui.NOTIFICATION_INFO)
-        data = '#EXTM3U\n'
-
-        for ch in self.channel_iter_stations():
-            url = self.mkurl(self.station, code=ch.code)
-            catch_url = self.mkurl(self._iptv_catchup_helper, ch.code, SafeQuoteStr('{Y}-{m}-{d}T{H}:{M}:{S}'))
-            data += f'#EXTINF:0 tvg-id="{ch.name}" tvg-logo="{ch.image}" catchup="default" ' \
-                    f'catchup-source="{catch_url}" catchup-days="7",' + f'{ch.name}\n{url}\n'
+        target = path_m3u + file_name
+        cache = self.cache('m3u')
+        stations = self.stations()
+        fingerprint = json.dumps([self.M3U_VERSION, target, stations], sort_keys=True)
+        fingerprint = hashlib.sha1(fingerprint.encode()).hexdigest()
+        if not force and cache.get(target, ttl=None) == fingerprint and xbmcvfs.exists(target):
+            log(f'M3U {target!r} is up to date', title='TVP')
+            notify(L(30184, 'Playlist M3U is up to date'))
+            return
 
+        notify(L(30134, 'Generate playlist'))
+        with self.vfs_writer(target) as f:
+            f.write('#EXTM3U\n')
+            for ch in self.channel_iter_stations():
+                url = self.mkurl(self.station, code=ch.code)
+                catch_url = self.mkurl(self._iptv_catchup_helper, ch.code, SafeQuoteStr('{Y}-{m}-{d}T{H}:{M}:{S}'))
+                f.write(f'#EXTINF:0 tvg-id="{ch.name}" tvg-logo="{ch.image}" catchup="default" '
+                        f'catchup-source="{catch_url}" catchup-days="7",{ch.name}\n{url}\n')
+        cache.set(target, fingerprint)
+        notify(L(30135, 'Playlist M3U generated'))
+
+    @contextmanager
+    def vfs_writer(self, path):
+        """Write file (xbmcvfs) atomically via temporary file."""
+        import xbmcvfs
+        tmp = f'{path}.tmp'
+        f = xbmcvfs.File(tmp, 'w')
         try:
-            f = xbmcvfs.File(path_m3u + file_name, 'w')
-            f.write(data)
-        finally:
+            yield f
+        except BaseException:
             f.close()
-        xbmcgui.Dialog().notification('[B]TVP[/B]', L(30135, 'Playlist M3U generated'), xbmcgui.NOTIFICATION_INFO)
+            xbmcvfs.delete(tmp)
+            raise
+        f.close()
+        if xbmcvfs.exists(path):
+            xbmcvfs.delete(path)
+        xbmcvfs.rename(tmp, path)
 
+    @staticmethod
+    def _xmltv_programme(channel, prog):
+        """Returns XMLTV <programme> element for `prog` (ChannelProgram) on `channel`."""
+        from xml.sax.saxutils import escape as xml_escape, quoteattr as xml_quoteattr
+
+        def tm(ms):
+            return f'{datetime.utcfromtimestamp(ms / 1000):%Y%m%d%H%M%S} +0000'
+
+        xml = (f'<programme start="{tm(prog["date_start"])}" stop="{tm(prog["date_end"])}"'
+               f' channel={xml_quoteattr(channel.name)}')
+        if prog.get('record_id'):
+            xml += f' catchup-id="{prog["record_id"]}"'
+        xml += f'>\n  <title lang="pl">{xml_escape(prog.title)}</title>\n'
+        descr = prog.plot or prog.outline
+        if descr:
+            xml += f'  <desc lang="pl">{xml_escape(remove_tags(descr))}</desc>\n'
+        eprog = prog.get('program') or {}
+        image = TvpPlugin._item_image(eprog, eprog.get('cycle'))
+        if image:
+            xml += f'  <icon src={xml_quoteattr(str(image))} />\n'
+        return xml + '</programme>\n'
+
+    def build_xmltv(self):
+        """
+        Generate XMLTV EPG for all stations in catch-up window.
 
-# DEBUG ONLY
-import sys  # noqa
+        Programmes are written as every channel-day arrives. Past days do not change,
+        so they are rendered once and kept in the cache (incremental regeneration).
+        """
+        from xml.sax.saxutils import escape as xml_escape, quoteattr as xml_quoteattr
+
+        path = self.settings.m3u_folder
+        file_name = self.settings.xmltv_filename
+        if not file_name or not path:
+            xbmcgui.Dialog().notification('[B]TVP[/B]', L(30132, 'Set filename and destination directory'),
+                                          xbmcgui.NOTIFICATION_ERROR)
+            return
+
+        xbmcgui.Dialog().notification('[B]TVP[/B]', L(30182, 'Generate EPG (XMLTV)'), xbmcgui.NOTIFICATION_INFO)
+        today = datetime.now().date()
+        dates = [f'{today + timedelta(days=n):%Y-%m-%d}'
+                 for n in range(-self.XMLTV_DAYS_BACK, self.XMLTV_DAYS_AHEAD + 1)]
+        cache = self.cache('xmltv')
+        channels = [ch for ch in self.channel_iter_stations() if ch.code]
+        with self.vfs_writer(path + file_name) as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE tv SYSTEM "xmltv.dtd">\n'
+                    '<tv generator-info-name="plugin.video.kpl.tvp">\n')
+            for ch in channels:
+                f.write(f'<channel id={xml_quoteattr(ch.name)}>\n'
+                        f'  <display-name lang="pl">{xml_escape(ch.name)}</display-name>\n')
+                if ch.image:
+                    f.write(f'  <icon src={xml_quoteattr(str(ch.image))} />\n')
+                f.write('</channel>\n')
+            for ch in channels:
+                # fragment: [(record_id, xml)], past days are already in the cache
+                fragments = {date: cache.get(f'{ch.code}:{date}', ttl=None) for date in dates}
+                missing = [date for date, frag in fragments.items() if frag is None or date >= f'{today:%Y-%m-%d}']
+                with self.site.concurrent() as con:
+                    for date in missing:
+                        con[date].station_epg(ch.code, date)
+                seen = set()
+                for date in dates:
+                    if date in missing:
+                        progs = (ChannelProgram(item) for item in con[date] or ())
+                        fragments[date] = [(prog.get('record_id'), self._xmltv_programme(ch, prog)) for prog in progs]
+                        if date < f'{today:%Y-%m-%d}':
+                            cache.set(f'{ch.code}:{date}', fragments[date], save=False)
+                    for rid, xml in fragments[date]:
+                        # programmes across midnight are in both days
+                        if rid is None or rid not in seen:
+                            seen.add(rid)
+                            f.write(xml)
+            f.write('</tv>\n')
+        cache.purge(ttl=(self.XMLTV_DAYS_BACK + 1) * 24 * 3600)
+        xbmcgui.Dialog().notification('[B]TVP[/B]', L(30183, 'EPG XMLTV generated'), xbmcgui.NOTIFICATION_INFO)
 
-log(f'TVP: {sys.argv}')
 
 # Create and run plugin.
 TvpPlugin().run()